@@ -0,0 +1,202 @@
+"""Tables de faits KPI pré-agrégées : commercial × jour et commercial × jour × créneau horaire.
+
+Sources : partitions journalières des appels HubSpot (hubspot-data/calls/…), RDVs.csv (rdvs)
+et plan_de_charge.csv (testrelation). Les commerciaux sont rapprochés par nom normalisé.
+Les mesures sont additives (comptages, sommes) pour que Power BI les ré-agrège sur n'importe
+quelle période ; les délais médians ne le sont pas, la somme et le nombre de délais sont donc
+exportés à côté pour la moyenne.
+"""
+import io, json, logging, os
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from azure.core.exceptions import ResourceNotFoundError
+from azure.storage.blob import BlobServiceClient
+
+from shared.commercial import normalize_commercial_name
+
+HISTORY_CONTAINER = os.environ.get("HUBSPOT_HISTORY_CONTAINER", "hubspot-data")
+MANIFEST = "_manifest.json"
+UNDATED = "undated"
+RDVS_SOURCE = (os.environ.get("KPI_RDVS_CONTAINER", "rdvs"), "RDVs.csv")
+PLAN_SOURCE = (os.environ.get("KPI_PLAN_CONTAINER", "testrelation"), "plan_de_charge.csv")
+CALLS_STATE = "kpis/calls_by_day.json.gz"
+READ_CONCURRENCY = 8
+
+CONNECTE = "Connecté"
+HORS_PLAGE = "Hors plage"
+# 🏷️ Statuts Notion comptés séparément (colonne de sortie)
+STATUTS = {"RDV fait": "RDVs_faits", "RDV confirmé": "RDVs_confirmés", "RDV annulé": "RDVs_annulés", "No Show": "No_show"}
+RDV_FAIT = "RDV fait"
+
+KEY = "Commercial_clé"
+CALL_MEASURES = ["Appels", "Appels_connectés", "Temps_parole_secondes", "Temps_parole_connectés_secondes"]
+RDV_MEASURES = ["RDVs_générés", "RDVs", *STATUTS.values(), "Délai_total_jours", "Délai_nb"]
+PLAN_MEASURES = ["Objectif_RDVs", "Appels_déclarés", "Conversations", "RDVs_pris"]
+
+# 🧾 Schémas de sortie fixes (ordre des colonnes du CSV)
+KPI_JOUR_COLUMNS = ["Date", "Commercial", KEY, *CALL_MEASURES, *RDV_MEASURES[:-2], "Délai_médian_jours",
+                    *RDV_MEASURES[-2:], *PLAN_MEASURES]
+KPI_CRENEAU_COLUMNS = ["Date", "Commercial", KEY, "Créneau Horaire", *CALL_MEASURES]
+
+# 🧱 Types de l'export Parquet
+KPI_JOUR_PARQUET_TYPES = {
+    "Date": "date", "Commercial": "category", KEY: "category",
+    **{c: "int" for c in CALL_MEASURES + RDV_MEASURES},
+    "Délai_médian_jours": "float",
+    **{c: "float" for c in PLAN_MEASURES},
+}
+KPI_CRENEAU_PARQUET_TYPES = {
+    "Date": "date", "Commercial": "category", KEY: "category", "Créneau Horaire": "category",
+    **{c: "int" for c in CALL_MEASURES},
+}
+
+
+def commercial_keys(names):
+    """Clé normalisée de chaque nom (calculée une fois par nom distinct)."""
+    names = names.fillna("")
+    return names.map({name: normalize_commercial_name(name) for name in names.unique()})
+
+
+def read_csv_blob(blob_service, container, blob_name, columns):
+    try:
+        raw = blob_service.get_blob_client(container, blob_name).download_blob().readall()
+    except ResourceNotFoundError:
+        logging.warning(f"⚠️ Source '{container}/{blob_name}' introuvable : considérée vide.")
+        return pd.DataFrame(columns=columns, dtype=object)
+    df = pd.read_csv(io.BytesIO(raw), encoding="utf-8-sig", dtype=str, usecols=lambda c: c in columns)
+    return df.reindex(columns=columns)
+
+
+# 📞 Appels d'une journée → une ligne par commercial × créneau
+def aggregate_calls(calls):
+    duree = pd.to_numeric(calls["Durée_Secondes"], errors="coerce").fillna(0).astype("int64")
+    connecte = calls["Résultat de l'appel"].eq(CONNECTE)
+    df = pd.DataFrame({
+        KEY: commercial_keys(calls["Activité attribuée à"]),
+        "Commercial": calls["Activité attribuée à"],
+        "Créneau Horaire": calls["Créneau Horaire"].fillna(HORS_PLAGE),
+        "Appels": 1,
+        "Appels_connectés": connecte.astype("int64"),
+        "Temps_parole_secondes": duree,
+        "Temps_parole_connectés_secondes": duree.where(connecte, 0),
+    })
+    return df.groupby([KEY, "Créneau Horaire"], as_index=False, sort=True).agg(
+        Commercial=("Commercial", "first"), **{c: (c, "sum") for c in CALL_MEASURES}
+    )
+
+
+def call_partitions(blob_service, container=HISTORY_CONTAINER):
+    """{jour: {"calls": chemin du CSV, "version": updated_at|rows}} d'après le manifeste de l'historique."""
+    try:
+        manifest = json.loads(blob_service.get_blob_client(container, MANIFEST).download_blob().readall())
+    except ResourceNotFoundError:
+        manifest = {"partitions": {}}
+    return {
+        day: {"calls": p["calls"], "version": f"{p.get('updated_at')}|{p['rows']}"}
+        for day, p in manifest["partitions"].items() if day != UNDATED
+    }
+
+
+def read_partitions(blob_service, partitions, days, columns, container=HISTORY_CONTAINER):
+    """(jour, DataFrame des appels) pour chaque jour, lus en parallèle ; vide sans partition."""
+    def read(day):
+        if day not in partitions:
+            return pd.DataFrame(columns=columns, dtype=object)
+        return read_csv_blob(blob_service, container, partitions[day]["calls"], columns)
+    with ThreadPoolExecutor(max_workers=READ_CONCURRENCY) as pool:
+        yield from zip(days, pool.map(read, days))
+
+
+class CallAggregates:
+    """
+    Agrégats d'appels par partition journalière, conservés dans etl-state : seules les partitions
+    dont l'entrée du manifeste a changé (updated_at, rows) sont relues, le coût d'un passage reste
+    proportionnel aux journées modifiées et non à la profondeur de l'historique.
+    """
+
+    def __init__(self, connection_string, store):
+        self.blob_service = BlobServiceClient.from_connection_string(connection_string)
+        self.store = store
+        self.cache = store.load(CALLS_STATE, {})
+
+    def refresh(self, partitions):
+        for day in set(self.cache) - set(partitions):
+            del self.cache[day]
+        stale = sorted(day for day, p in partitions.items() if self.cache.get(day, {}).get("version") != p["version"])
+
+        columns = ["Durée_Secondes", "Résultat de l'appel", "Activité attribuée à", "Créneau Horaire"]
+        for day, calls in read_partitions(self.blob_service, partitions, stale, columns):
+            self.cache[day] = {"version": partitions[day]["version"], "rows": aggregate_calls(calls).to_dict("records")}
+        logging.info(f"📞 Agrégats d'appels : {len(stale)} journée(s) recalculée(s) sur {len(partitions)}.")
+        return len(stale)
+
+    def save(self):
+        self.store.save(CALLS_STATE, self.cache)
+
+    def frame(self):
+        rows = [dict(row, Date=day) for day, entry in sorted(self.cache.items()) for row in entry["rows"]]
+        return pd.DataFrame(rows, columns=["Date", KEY, "Créneau Horaire", "Commercial", *CALL_MEASURES])
+
+
+# 📅 RDVs : générés (jour de génération), statuts et délais (jour du RDV)
+def aggregate_rdvs(rdvs):
+    key = commercial_keys(rdvs["Responsable"])
+    generation = rdvs["Date_generation"].str[:10]
+    jour_rdv = rdvs["DateTime_RDV"].fillna(rdvs["Date_RDV"]).str[:10]
+
+    generes = pd.DataFrame({KEY: key, "Commercial": rdvs["Responsable"], "Date": generation, "RDVs_générés": 1})
+    generes = generes[generes["Date"].notna()]
+
+    fait = rdvs["Statut"].eq(RDV_FAIT)
+    # ⏳ Délai génération → RDV fait en jours calendaires (DATEDIFF … DAY)
+    delai = (pd.to_datetime(jour_rdv, errors="coerce") - pd.to_datetime(generation, errors="coerce")).dt.days
+    statuts = pd.DataFrame({KEY: key, "Commercial": rdvs["Responsable"], "Date": jour_rdv, "RDVs": 1,
+                            "_delai": delai.where(fait)})
+    for statut, column in STATUTS.items():
+        statuts[column] = rdvs["Statut"].eq(statut).astype("int64")
+    statuts = statuts[statuts["Date"].notna()].groupby([KEY, "Date"], as_index=False, sort=False).agg(
+        Commercial=("Commercial", "first"), RDVs=("RDVs", "sum"),
+        **{c: (c, "sum") for c in STATUTS.values()},
+        Délai_médian_jours=("_delai", "median"), Délai_total_jours=("_delai", "sum"), Délai_nb=("_delai", "count")
+    )
+    return pd.concat([generes, statuts], ignore_index=True)
+
+
+# 🎯 Plan de charge : objectifs et déclaratif par commercial et jour de session
+def aggregate_plan(plan):
+    df = pd.DataFrame({
+        KEY: commercial_keys(plan["Commercial"]),
+        "Commercial": plan["Commercial"],
+        "Date": plan["Start"].str[:10],
+        "Objectif_RDVs": pd.to_numeric(plan["Objectif_RDVs"], errors="coerce"),
+        "Appels_déclarés": pd.to_numeric(plan["Appels"], errors="coerce"),
+        "Conversations": pd.to_numeric(plan["Conversations"], errors="coerce"),
+        "RDVs_pris": pd.to_numeric(plan["RDVs"], errors="coerce"),
+    })
+    return df[df["Date"].notna()]
+
+
+def build_facts(calls, rdvs, plan):
+    """Renvoie (commercial × jour, commercial × jour × créneau) à partir des agrégats de chaque source."""
+    creneaux = calls.sort_values(["Date", KEY, "Créneau Horaire"], kind="mergesort").reindex(columns=KPI_CRENEAU_COLUMNS)
+
+    # 🏷️ Un nom affiché par commercial : plan de charge, puis dimension commerciaux (RDVs), puis HubSpot
+    sources = [aggregate_plan(plan), aggregate_rdvs(rdvs), calls.drop(columns="Créneau Horaire")]
+    jour = pd.concat([pd.DataFrame(columns=KPI_JOUR_COLUMNS)] + [s for s in sources if len(s)],
+                     ignore_index=True).reindex(columns=KPI_JOUR_COLUMNS)
+    jour["Commercial"] = jour["Commercial"].replace("", None)
+    noms = jour.groupby(KEY, sort=False)["Commercial"].first()
+    jour[PLAN_MEASURES] = jour[PLAN_MEASURES].astype("float64")
+    grouped = jour.groupby(["Date", KEY], sort=True)
+    # 🎯 Jour sans plan de charge : objectifs vides (NaN), pas 0 — les taux d'atteinte restent indéfinis
+    jour = pd.concat([
+        grouped["Délai_médian_jours"].first(),
+        grouped[CALL_MEASURES + RDV_MEASURES].sum(),
+        grouped[PLAN_MEASURES].sum(min_count=1),
+    ], axis=1).reset_index().reindex(columns=KPI_JOUR_COLUMNS)
+    jour["Commercial"] = jour[KEY].map(noms).fillna("")
+    creneaux["Commercial"] = creneaux[KEY].map(noms).fillna(creneaux["Commercial"])
+    jour[CALL_MEASURES + RDV_MEASURES] = jour[CALL_MEASURES + RDV_MEASURES].astype("int64")
+    jour[["Délai_médian_jours", *PLAN_MEASURES]] = jour[["Délai_médian_jours", *PLAN_MEASURES]].astype("float64")
+    creneaux[CALL_MEASURES] = creneaux[CALL_MEASURES].astype("int64")
+    return jour, creneaux
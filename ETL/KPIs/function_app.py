@@ -0,0 +1,79 @@
+import logging, os, sys
+import azure.functions as func
+from azure.core.exceptions import ResourceNotFoundError
+from azure.storage.blob import BlobServiceClient
+
+# 📦 Modules communs (ETL/shared, copié à la racine de la fonction au déploiement)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared import run_guard
+from shared.blob_sink import BlobSink
+from shared.parquet_export import write_frame
+from shared.state import StateStore
+from facts import (HISTORY_CONTAINER, KPI_CRENEAU_PARQUET_TYPES, KPI_JOUR_PARQUET_TYPES, MANIFEST, PLAN_SOURCE,
+                   RDVS_SOURCE, CallAggregates, build_facts, call_partitions, read_csv_blob)
+from plan_vs_actual import HORS_SESSION_PARQUET_TYPES, PLAN_COLUMNS, PLAN_VS_REEL_PARQUET_TYPES, SessionJoin
+
+KPI_CONTAINER = os.environ.get("KPI_CONTAINER", "kpis")
+SOURCES_STATE = "kpis/sources.json"
+
+app = func.FunctionApp()
+
+
+# 🔖 ETag des sources : inchangés depuis le dernier passage → rien à recalculer
+def sources_signature(blob_service):
+    signature = {}
+    for container, blob_name in ((HISTORY_CONTAINER, MANIFEST), RDVS_SOURCE, PLAN_SOURCE):
+        try:
+            signature[f"{container}/{blob_name}"] = blob_service.get_blob_client(container, blob_name).get_blob_properties().etag
+        except ResourceNotFoundError:
+            signature[f"{container}/{blob_name}"] = None
+    return signature
+
+
+@app.function_name(name="build_kpi_facts")
+@app.schedule(schedule="0 */10 * * * *", arg_name="myTimer", run_on_startup=False, use_monitor=False)
+@run_guard.singleton("build_kpi_facts")
+def build_kpi_facts(myTimer: func.TimerRequest) -> None:
+    logging.info("📊 Construction des tables de faits KPI...")
+
+    connection_string = os.environ["AZURE_STORAGE_CONNECTION_STRING"]
+    blob_service = BlobServiceClient.from_connection_string(connection_string)
+    store = StateStore(connection_string)
+
+    signature = sources_signature(blob_service)
+    if signature == store.load(SOURCES_STATE):
+        logging.info("⏭️ Sources inchangées : tables KPI inchangées.")
+        return
+
+    partitions = call_partitions(blob_service)
+    calls = CallAggregates(connection_string, store)
+    calls.refresh(partitions)
+    rdvs = read_csv_blob(blob_service, *RDVS_SOURCE,
+                         ["Date_generation", "Date_RDV", "DateTime_RDV", "Statut", "Responsable"])
+    plan = read_csv_blob(blob_service, *PLAN_SOURCE, PLAN_COLUMNS)
+    jour, creneaux = build_facts(calls.frame(), rdvs, plan)
+    logging.info(f"📦 {len(jour)} ligne(s) commercial × jour, {len(creneaux)} ligne(s) commercial × jour × créneau")
+
+    # 🔗 Plan de charge vs appels réels, session par session
+    sessions = SessionJoin(connection_string, store)
+    sessions.refresh(partitions, plan)
+    plan_vs_reel, hors_session = sessions.frames()
+
+    try:
+        for name, frame, types in (("kpi_commercial_jour", jour, KPI_JOUR_PARQUET_TYPES),
+                                   ("kpi_commercial_creneau", creneaux, KPI_CRENEAU_PARQUET_TYPES),
+                                   ("plan_vs_reel_sessions", plan_vs_reel, PLAN_VS_REEL_PARQUET_TYPES),
+                                   ("appels_hors_session", hors_session, HORS_SESSION_PARQUET_TYPES)):
+            with BlobSink(connection_string, KPI_CONTAINER, f"{name}.csv", encoding="utf-8-sig") as out:
+                out.rows = len(frame)
+                frame.to_csv(out, index=False)
+            write_frame(connection_string, KPI_CONTAINER, f"{name}.parquet", frame, types)
+            logging.info(f"✅ Fichier '{name}.csv' {'uploadé' if out.changed else 'inchangé'} dans Azure Blob Storage.")
+    except Exception as e:
+        logging.error(f"❌ Erreur upload Azure : {e}")
+        return
+
+    # 💾 Agrégats et signature enregistrés après un upload réussi
+    calls.save()
+    sessions.save()
+    store.save(SOURCES_STATE, signature)
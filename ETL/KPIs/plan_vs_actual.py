@@ -0,0 +1,141 @@
+"""Plan de charge ↔ appels HubSpot : jointure par intervalle (commercial, [Start, End]).
+
+Chaque appel est rattaché par merge_asof à la dernière session du même commercial commencée
+avant lui, et retenu s'il tombe avant la fin de cette session : deux tris et une recherche,
+O((n + m) log n), sans produit cartésien. Les appels restants sont signalés hors session.
+Le rapprochement se fait journée par journée (jour de début de session, partitions d'appels),
+sur toutes les journées d'appels depuis le premier jour planifié (une journée sans session
+signale tous ses appels) : seules les journées dont les appels ou les sessions ont changé sont recalculées.
+"""
+import hashlib, logging
+import numpy as np
+import pandas as pd
+from azure.storage.blob import BlobServiceClient
+
+from facts import CONNECTE, KEY, commercial_keys, read_partitions
+
+DATE_COL = "Date d’activité"
+SESSIONS_STATE = "kpis/sessions_by_day.json.gz"
+HORS_SESSION = "Hors session"
+SANS_SESSION = "Aucune session ce jour"
+
+CALL_COLUMNS = ["id", "Durée_Secondes", "Résultat de l'appel", DATE_COL, "Activité attribuée à"]
+PLAN_COLUMNS = ["Cible", "Commercial", "Appels", "Conversations", "RDVs", "Objectif_RDVs", "Start", "End",
+                "Nom_Client", "ID_Page_Client"]
+ACTUAL_MEASURES = ["Appels_réels", "Appels_connectés_réels", "Temps_parole_réel_secondes"]
+
+# 🧾 Schémas de sortie fixes (ordre des colonnes du CSV)
+PLAN_VS_REEL_COLUMNS = ["Date", "Commercial", KEY, "Cible", "Nom_Client", "ID_Page_Client", "Start", "End",
+                        "Appels", "Conversations", "RDVs", "Objectif_RDVs", *ACTUAL_MEASURES,
+                        "Premier_appel", "Dernier_appel"]
+HORS_SESSION_COLUMNS = ["Date", "Commercial", KEY, "id", DATE_COL, "Durée_Secondes", "Résultat de l'appel", "Motif"]
+
+# 🧱 Types de l'export Parquet
+PLAN_VS_REEL_PARQUET_TYPES = {
+    "Date": "date", "Commercial": "category", KEY: "category", "Cible": "string", "Nom_Client": "category",
+    "ID_Page_Client": "string", "Start": "timestamptz", "End": "timestamptz",
+    "Appels": "float", "Conversations": "float", "RDVs": "float", "Objectif_RDVs": "float",
+    **{c: "int" for c in ACTUAL_MEASURES},
+    "Premier_appel": "timestamptz", "Dernier_appel": "timestamptz",
+}
+HORS_SESSION_PARQUET_TYPES = {
+    "Date": "date", "Commercial": "category", KEY: "category", "id": "string", DATE_COL: "timestamptz",
+    "Durée_Secondes": "int", "Résultat de l'appel": "category", "Motif": "category",
+}
+
+
+def prepare_sessions(plan):
+    """Sessions datées avec clé commercial et bornes UTC ; sans fin, la session est réduite à son début."""
+    sessions = plan.assign(**{KEY: commercial_keys(plan["Commercial"]), "Date": plan["Start"].str[:10]})
+    sessions = sessions[sessions["Date"].notna()].copy()
+    for column in ("Appels", "Conversations", "RDVs", "Objectif_RDVs"):
+        sessions[column] = pd.to_numeric(sessions[column], errors="coerce")
+    sessions["_debut"] = pd.to_datetime(sessions["Start"], utc=True, format="ISO8601").dt.as_unit("ms")
+    sessions["_fin"] = pd.to_datetime(sessions["End"], utc=True, format="ISO8601").dt.as_unit("ms").fillna(sessions["_debut"])
+    return sessions
+
+
+def join_day(calls, sessions, day):
+    """
+    Appels et sessions (éventuellement aucune) de la journée day → (sessions avec réalisé, appels hors session).
+    Sessions qui se chevauchent pour un commercial : l'appel va à la plus récemment commencée.
+    """
+    sessions = sessions.sort_values(["_debut", KEY], kind="mergesort").reset_index(drop=True)
+    sessions["_session"] = sessions.index
+    sessions[KEY] = sessions[KEY].astype(object)
+
+    calls = calls.assign(**{
+        KEY: commercial_keys(calls["Activité attribuée à"]).astype(object),
+        "_ts": pd.to_datetime(calls[DATE_COL], utc=True, format="ISO8601").dt.as_unit("ms"),
+        "Durée_Secondes": pd.to_numeric(calls["Durée_Secondes"], errors="coerce").fillna(0).astype("int64"),
+        "_connecte": calls["Résultat de l'appel"].eq(CONNECTE).astype("int64"),
+    })
+    calls = calls[calls["_ts"].notna()].sort_values("_ts", kind="mergesort")
+    matched = pd.merge_asof(calls, sessions[[KEY, "_debut", "_fin", "_session"]],
+                            left_on="_ts", right_on="_debut", by=KEY, direction="backward")
+    inside = matched["_session"].notna() & (matched["_ts"] <= matched["_fin"])
+
+    # 📊 Réalisé par session (appels triés : premier / dernier = min / max)
+    actual = matched[inside].groupby("_session").agg(
+        Appels_réels=("_ts", "size"), Appels_connectés_réels=("_connecte", "sum"),
+        Temps_parole_réel_secondes=("Durée_Secondes", "sum"),
+        Premier_appel=(DATE_COL, "first"), Dernier_appel=(DATE_COL, "last")
+    )
+    per_session = sessions.join(actual, on="_session")
+    per_session[ACTUAL_MEASURES] = per_session[ACTUAL_MEASURES].fillna(0).astype("int64")
+
+    # 🚩 Appels hors session : commercial planifié ce jour-là ou non
+    outside = matched[~inside].rename(columns={"Activité attribuée à": "Commercial"})
+    outside["Date"] = day
+    outside["Motif"] = np.where(outside[KEY].isin(set(sessions[KEY])), HORS_SESSION, SANS_SESSION)
+    return per_session.reindex(columns=PLAN_VS_REEL_COLUMNS), outside.reindex(columns=HORS_SESSION_COLUMNS)
+
+
+def _records(df):
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+
+class SessionJoin:
+    """Rapprochement par journée conservé dans etl-state (version = partition d'appels + sessions du jour)."""
+
+    def __init__(self, connection_string, store):
+        self.blob_service = BlobServiceClient.from_connection_string(connection_string)
+        self.store = store
+        self.cache = store.load(SESSIONS_STATE, {})
+
+    def refresh(self, partitions, plan):
+        sessions = prepare_sessions(plan)
+        by_day = dict(tuple(sessions.groupby("Date", sort=True)))
+        # 📅 Journées planifiées et journées d'appels depuis le premier jour planifié (historique antérieur ignoré)
+        first = min(by_day, default=None)
+        days = set(by_day) | {day for day in partitions if first and day >= first}
+        no_session = sessions.iloc[0:0]
+        version = {
+            day: f"{partitions.get(day, {}).get('version')}|"
+                 + hashlib.sha1(by_day.get(day, no_session)[PLAN_COLUMNS].to_json(orient="values").encode("utf-8")).hexdigest()
+            for day in days
+        }
+
+        for day in set(self.cache) - days:
+            del self.cache[day]
+        stale = sorted(day for day in days if self.cache.get(day, {}).get("version") != version[day])
+
+        outside = 0
+        for day, calls in read_partitions(self.blob_service, partitions, stale, CALL_COLUMNS):
+            per_session, hors = join_day(calls, by_day.get(day, no_session), day)
+            self.cache[day] = {"version": version[day], "sessions": _records(per_session), "hors_session": _records(hors)}
+            outside += len(hors)
+        logging.info(f"🔗 Plan vs réalisé : {len(stale)} journée(s) recalculée(s) sur {len(days)} "
+                     f"({len(days) - len(by_day)} sans session), {outside} appel(s) hors session sur ces journées.")
+        return len(stale)
+
+    def save(self):
+        self.store.save(SESSIONS_STATE, self.cache)
+
+    def frames(self):
+        """(plan vs réalisé par session, appels hors session) depuis le premier jour planifié."""
+        days = sorted(self.cache.items())
+        per_session = pd.DataFrame([row for _, entry in days for row in entry["sessions"]], columns=PLAN_VS_REEL_COLUMNS)
+        outside = pd.DataFrame([row for _, entry in days for row in entry["hors_session"]], columns=HORS_SESSION_COLUMNS)
+        per_session[ACTUAL_MEASURES] = per_session[ACTUAL_MEASURES].astype("int64")
+        return per_session, outside
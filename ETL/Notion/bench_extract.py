@@ -0,0 +1,255 @@
+"""
+Benchmark : construction des lignes Notion, plans d'accesseurs (shared/notion_schema.py) vs code précédent.
+
+Références : les build_row écrits à la main (dim_clients : dict littéral, RDVs : safe_get) et
+l'interprétation générique des spécifications (aiguillage par type à chaque cellule).
+Vérifie que les lignes sont identiques puis affiche le débit (pages/s) de chaque variante.
+Pages enregistrées (réponses de l'API) ou synthétiques, générées d'après databases.json.
+Usage : python bench_extract.py [--pages 50000] [--recorded pages.json --spec rdvs]
+        python bench_extract.py --record rdvs --out pages.json   (NOTION_TOKEN + id de la base)
+"""
+import argparse, gc, json, os, random, sys, time
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared.notion_extract import load_specs
+
+REPEAT = 5
+SPECS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "databases.json")
+
+
+def _rich_text(rng, words):
+    text = " ".join(rng.choice(words) for _ in range(rng.randint(1, 40)))
+    return [{"type": "text", "text": {"content": text, "link": None}, "plain_text": text,
+             "annotations": {"bold": False, "italic": False, "color": "default"}, "href": None}]
+
+
+def synthetic_property(kind, rng, words):
+    empty = rng.random() < 0.2
+    day = f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+    values = {
+        "title": lambda: [] if empty else _rich_text(rng, words),
+        "rich_text": lambda: [] if empty else _rich_text(rng, words),
+        "select": lambda: None if empty else {"id": "s", "name": rng.choice(words), "color": "blue"},
+        "status": lambda: None if empty else {"id": "s", "name": rng.choice(["RDV fait", "No Show", "Actif"]), "color": "green"},
+        "multi_select": lambda: [{"id": "m", "name": w, "color": "red"} for w in rng.sample(words, 0 if empty else 3)],
+        "number": lambda: None if empty else round(rng.uniform(0, 1000), 2),
+        "checkbox": lambda: rng.random() < 0.5,
+        "formula": lambda: {"type": "number", "number": None if empty else rng.uniform(0, 100)},
+        "date": lambda: None if empty else {"start": rng.choice([day, f"{day}T10:00:00.000+02:00"]),
+                                            "end": f"{day}T12:00:00.000+02:00", "time_zone": None},
+        "people": lambda: [] if empty else [{"object": "user", "id": "u", "name": rng.choice(words)}],
+        "unique_id": lambda: {"prefix": "CL", "number": rng.randint(1, 9999)},
+        "relation": lambda: [] if empty else [{"id": f"{rng.randint(0, 50):08x}-0000-0000-0000-000000000000"}],
+    }
+    return {"id": "x", "type": kind, kind: values[kind]()}
+
+
+def synthetic_pages(spec, n, seed=42):
+    """Pages au format de l'API : propriétés lues par la spécification + propriétés ignorées (rollups, textes)."""
+    rng = random.Random(seed)
+    words = [f"mot{i}" for i in range(200)]
+    properties = {column["property"]: column["type"] for column in spec.columns.values() if "property" in column}
+    extra = {f"Note {i}": "rich_text" for i in range(5)}
+    pages = []
+    for i in range(n):
+        props = {name: synthetic_property(kind, rng, words) for name, kind in {**properties, **extra}.items()}
+        pages.append({"object": "page", "id": f"{i:08x}-0000-0000-0000-000000000000",
+                      "last_edited_time": "2025-06-01T10:00:00.000Z", "archived": False, "properties": props})
+    return pages
+
+
+def recorded_pages(path):
+    """Fichier JSON : liste de pages, ou liste de réponses de requête ({"results": [...]})."""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = [data]
+    return [page for item in data for page in (item["results"] if "results" in item else [item])]
+
+
+# 🐢 Interprétation générique des spécifications (aiguillage par type à chaque cellule)
+def _text(fragments):
+    if isinstance(fragments, list) and len(fragments) > 0:
+        return fragments[0].get("text", {}).get("content", "")
+    return ""
+
+
+def _date(prop, column):
+    value = (prop.get("date") or {}).get(column.get("part", "start"))
+    if value and column.get("format"):
+        try:
+            return datetime.fromisoformat(value).strftime(column["format"])
+        except ValueError:
+            return f"{value} 00:00:00"
+    return value
+
+
+INTERPRETED = {
+    "title": lambda prop, column: _text(prop.get("title")),
+    "rich_text": lambda prop, column: _text(prop.get("rich_text")),
+    "select": lambda prop, column: (prop.get("select") or {}).get("name"),
+    "status": lambda prop, column: (prop.get("status") or {}).get("name"),
+    "multi_select": lambda prop, column: ", ".join(item["name"] for item in prop.get("multi_select") or []),
+    "number": lambda prop, column: prop.get("number"),
+    "checkbox": lambda prop, column: prop.get("checkbox"),
+    "formula": lambda prop, column: (prop.get("formula") or {}).get((prop.get("formula") or {}).get("type")),
+    "date": _date,
+    "people": lambda prop, column: (prop.get("people") or [{}])[0].get("name"),
+    "unique_id": lambda prop, column: ((prop.get("unique_id") or {}).get("prefix") or "") + str((prop.get("unique_id") or {}).get("number", "")),
+    "relation": lambda prop, column: (prop.get("relation") or [{}])[0].get("id"),
+}
+
+
+def interpreted_builder(spec):
+    def build_row(page):
+        properties = page["properties"]
+        row = {}
+        for name, column in spec.columns.items():
+            kind = column["type"]
+            if kind == "page_id":
+                value = page["id"]
+            elif kind == "relation_title":
+                value = ""
+            else:
+                prop = properties.get(column["property"])
+                value = INTERPRETED[kind](prop, column) if prop else None
+            row[name] = column.get("default", "") if value is None else value
+        return row
+    return build_row
+
+
+# 🐢 build_row écrits à la main (Dim-Clients/ et RDVs/ avant le moteur piloté par configuration)
+def legacy_dim_clients(page):
+    p = page["properties"]
+    return {
+        "Nom": _text(p["Nom"]["title"]),
+        "Statut": p["Statut"]["status"]["name"] if p["Statut"].get("status") else "",
+        "Score_Coopération": p["Score de Coopération"].get("number", ""),
+        "Score_Client": p["Score Client (Formule)"]["formula"].get("number", ""),
+        "ID_Client": p["ID Client"]["unique_id"].get("prefix", "") + str(p["ID Client"]["unique_id"].get("number", "")),
+        "Démarrage_1er_Contrat": p["Démarrage 1er Contrat"]["date"].get("start", "") if p["Démarrage 1er Contrat"].get("date") else "",
+        "Type": p["Type"]["select"]["name"] if p["Type"].get("select") else "",
+        "Type_de_Secteur": p["Type de Secteur"]["select"]["name"] if p["Type de Secteur"].get("select") else "",
+        "Taille_Entreprise": p["Taille d'entreprise"]["select"]["name"] if p["Taille d'entreprise"].get("select") else "",
+        "Taille_Entreprise_Ciblee": ', '.join([item["name"] for item in p["Taille d'entreprise ciblée"]["multi_select"]]),
+        "Potentiel_Upsell": p["Potentiel d'Upsell"].get("number", ""),
+        "Prestation": ', '.join([item["name"] for item in p["Prestation"]["multi_select"]]),
+        "Localisation": _text(p["Localisation"]["rich_text"]),
+        "Objectif_RDVs": p["Objectif RDVs"].get("number", ""),
+        "Mensualites_HT": p["Mensualités (H.T.)"].get("number", ""),
+        "Marque_Client": p["Marque du Client"].get("number", ""),
+        "Code_NAF": _text(p["Code NAF"]["rich_text"]),
+        "Delai_Moyen_Paiement": p["Délai moyen paiement Factures (Jours)"].get("number", ""),
+        "Niveau_Energie": p["Niveau d'énergie demandé"].get("number", ""),
+        "Difficulte_Projet": p["Difficulté Projet"].get("number", ""),
+        "Source": p["Source"]["select"]["name"] if p["Source"].get("select") else "",
+        "Leads_envoyes_GH": p["Leads envoyés à GH"].get("number", ""),
+        "Secteurs_Cibles": _text(p["Secteur(s) ciblé(s)"]["rich_text"]),
+        "Panier_Moyen_Client": p["Panier Moyen (Client)"].get("number", ""),
+        "ROI_Potentiel_Client": p["ROI potentiel Client"].get("number", ""),
+        "ROI_Reel_Client": p["ROI réel Client"].get("number", ""),
+        "Feedbacks_Terrain": _text(p["Feedbacks terrain"]["rich_text"]),
+        "Account_Manager": p["Account Manager(s)"]["people"][0]["name"] if p["Account Manager(s)"]["people"] else "",
+        "ID_Page": page["id"]
+    }
+
+
+def safe_get(dct, *keys, default=None):
+    for key in keys:
+        if isinstance(dct, dict):
+            dct = dct.get(key, default)
+        else:
+            return default
+    return dct
+
+
+def legacy_rdvs(page):
+    p = page["properties"]
+    date_rdv = safe_get(p, "Date & Heure RDV", "date", "start")
+    if date_rdv:
+        try:
+            datetime_rdv = datetime.fromisoformat(date_rdv).strftime("%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            datetime_rdv = f"{date_rdv} 00:00:00"
+    else:
+        datetime_rdv = None
+    commercial_rel = p.get("Commercial", {}).get("relation", [])
+    client_rel = p.get("Client", {}).get("relation", [])
+    return {
+        "Date_generation": safe_get(p, "Date de génération", "date", "start"),
+        "Date_RDV": date_rdv,
+        "DateTime_RDV": datetime_rdv,
+        "Statut": safe_get(p, "Statut", "status", "name"),
+        "Intitulé_poste": safe_get(p, "Intitulé du poste", "rich_text", 0, "text", "content", default=""),
+        "Source_RDV": safe_get(p, "Source RDV", "select", "name"),
+        "Responsable": "",
+        "Nom_Client": "",
+        "ID_Page_Commercial": commercial_rel[0]["id"] if commercial_rel else "",
+        "ID_Page_Client": client_rel[0]["id"] if client_rel else ""
+    }
+
+
+# Intitulé_poste : safe_get ne sait pas indexer la liste rich_text, l'ancien code écrivait toujours ""
+LEGACY = {"dim_clients": (legacy_dim_clients, set()), "rdvs": (legacy_rdvs, {"Intitulé_poste"})}
+
+
+def timed(build_row, pages, repeat=REPEAT):
+    """Lignes et meilleur temps sur `repeat` passages (bruit de la machine écarté)."""
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()  # ⏱️ ramasse-miettes suspendu : temps comparables d'une variante à l'autre
+        try:
+            started = time.perf_counter()
+            rows = [build_row(page) for page in pages]
+            elapsed = time.perf_counter() - started
+        finally:
+            gc.enable()
+        best = elapsed if best is None else min(best, elapsed)
+    return rows, best
+
+
+def record(spec, out):
+    from shared.notion import iter_database_pages, notion_headers
+    pages = list(iter_database_pages(spec.database_id, notion_headers()))
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(pages, f, ensure_ascii=False)
+    print(f"{len(pages)} pages de '{spec.name}' enregistrées dans {out}")
+
+
+def bench(spec, pages):
+    planned, t_planned = timed(spec.plan.new_run(), pages)
+    interpreted, t_interpreted = timed(interpreted_builder(spec), pages)
+    line = (f"{spec.name:<16} {len(pages)} pages | plan : {len(pages) / t_planned:,.0f} p/s | "
+            f"interprété : {len(pages) / t_interpreted:,.0f} p/s (x{t_interpreted / t_planned:.1f}, "
+            f"identique : {planned == interpreted})")
+    if spec.name in LEGACY:
+        legacy_row, ignored = LEGACY[spec.name]
+        legacy, t_legacy = timed(legacy_row, pages)
+        identical = all({k: v for k, v in a.items() if k not in ignored} == {k: v for k, v in b.items() if k not in ignored}
+                        for a, b in zip(legacy, planned))
+        line += f" | écrit à la main : {len(pages) / t_legacy:,.0f} p/s (x{t_legacy / t_planned:.1f}, identique : {identical})"
+    print(line)
+
+
+def main():
+    args = argparse.ArgumentParser()
+    args.add_argument("--pages", type=int, default=50_000)
+    args.add_argument("--recorded", help="pages enregistrées (JSON) ; nécessite --spec")
+    args.add_argument("--spec", help="base de databases.json (défaut : toutes)")
+    args.add_argument("--record", help="enregistre les pages de cette base (voir --out)")
+    args.add_argument("--out", default="pages.json")
+    opts = args.parse_args()
+
+    specs = {spec.name: spec for spec in load_specs(SPECS_PATH)}
+    if opts.record:
+        return record(specs[opts.record], opts.out)
+    if opts.recorded:
+        return bench(specs[opts.spec], recorded_pages(opts.recorded))
+    for name in [opts.spec] if opts.spec else specs:
+        bench(specs[name], synthetic_pages(specs[name], opts.pages))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+import logging, os, sys
+import azure.functions as func
+
+# 📦 Modules communs (ETL/shared, copié à la racine de la fonction au déploiement)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared import http_client, notion_extract, run_guard
+from shared.notion import notion_headers
+from shared.state import StateStore
+
+# 🧾 Spécifications des bases extraites (schéma, relations, destination) : ajouter une base = ajouter une entrée
+SPECS = notion_extract.load_specs(os.path.join(os.path.dirname(os.path.abspath(__file__)), "databases.json"))
+
+app = func.FunctionApp()
+
+
+@app.function_name(name="extract_notion")
+@app.schedule(schedule="*/30 * * * * *", arg_name="myTimer", run_on_startup=False, use_monitor=False)
+@run_guard.singleton("extract_notion")
+@http_client.with_metrics
+def extract_notion(myTimer: func.TimerRequest) -> None:
+    logging.info("🔁 Déclenchement de l'extraction Notion...")
+
+    connection_string = os.environ["AZURE_STORAGE_CONNECTION_STRING"]
+    notion_extract.run_all(SPECS, connection_string, notion_headers(), StateStore(connection_string))
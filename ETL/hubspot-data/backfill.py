@@ -0,0 +1,223 @@
+"""Backfill historique HubSpot reprenable : unités journalières, points de reprise et rapport de complétude.
+
+Chaque journée (GMT+2) de la période est une unité de travail. Son total attendu est demandé à la
+planification, puis ses fenêtres sont récupérées par le moteur asynchrone, plusieurs journées à la fois
+sous un même budget de débit. Curseurs de pagination et appels déjà reçus sont sauvegardés
+régulièrement dans etl-state : après un plantage ou un dépassement du délai d'exécution, la reprise
+repart des curseurs. Une journée terminée est publiée dans l'historique partitionné (history_store) ;
+une relance ne récupère que les journées manquantes, en échec ou incomplètes.
+
+Exécution locale :
+    python backfill.py --start 2024-05-23 --end 2025-05-14
+"""
+import argparse, logging, os, sys, time
+from datetime import date, datetime, timedelta
+
+# 📦 Modules communs (ETL/shared, copié à la racine de la fonction au déploiement)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared.blob_sink import BlobSink
+from shared.csv_export import write_csv
+from shared.state import StateStore
+from calls_sync import count_calls, fetch_owner_map, gmt_plus_2, merge_calls, plan_windows
+from fetch_engine import DailyQuotaExhausted, fetch_windows
+from history_store import HistoryStore, call_day
+
+CHECKPOINT_STATE = "hubspot/backfill/{start}_{end}.json"
+PARTIAL_STATE = "hubspot/backfill/partial/{day}.json.gz"
+REPORT_BLOB = "_backfill/{start}_{end}.csv"
+REPORT_COLUMNS = ["Jour", "Statut", "Attendus", "Récupérés", "Tentatives", "Erreur"]
+
+PARALLEL_UNITS = int(os.environ.get("BACKFILL_PARALLEL_UNITS", "8"))
+MAX_ATTEMPTS = int(os.environ.get("BACKFILL_MAX_ATTEMPTS", "3"))
+TIME_BUDGET_SECONDS = int(os.environ.get("BACKFILL_TIME_BUDGET_SECONDS", "480"))
+CHECKPOINT_INTERVAL_SECONDS = 30
+
+
+def day_bounds_ms(day):
+    start = datetime.strptime(day, "%Y-%m-%d").replace(tzinfo=gmt_plus_2)
+    return int(start.timestamp() * 1000), int((start + timedelta(days=1)).timestamp() * 1000) - 1
+
+
+class Backfill:
+    def __init__(self, token, headers, connection_string, start_date, end_date, owner_map,
+                 idle_threshold=1800, per_second=4, max_concurrency=16):
+        self.token = token
+        self.headers = headers
+        self.owner_map = owner_map
+        self.idle_threshold = idle_threshold
+        self.engine_options = {"per_second": per_second, "max_concurrency": max_concurrency}
+        self.store = StateStore(connection_string)
+        self.history = HistoryStore(connection_string)
+        self.connection_string = connection_string
+        self.range = {"start": start_date.isoformat(), "end": end_date.isoformat()}
+        self.state_name = CHECKPOINT_STATE.format(**self.range)
+        self.state = self.store.load(self.state_name) or {"units": {}}
+
+        # 🧩 Une unité par journée ; les journées déjà connues gardent leur statut
+        day = start_date
+        while day <= end_date:
+            self.state["units"].setdefault(day.isoformat(), {"status": "pending", "attempts": 0})
+            day += timedelta(days=1)
+
+    def pending(self):
+        return [
+            day for day, unit in sorted(self.state["units"].items())
+            if unit["status"] in ("pending", "running")
+            or (unit["status"] in ("failed", "incomplete") and unit["attempts"] < MAX_ATTEMPTS)
+        ]
+
+    def run(self, time_budget=TIME_BUDGET_SECONDS):
+        deadline = time.monotonic() + time_budget
+        try:
+            while time.monotonic() < deadline:
+                batch = self.pending()[:PARALLEL_UNITS]
+                if not batch:
+                    break
+                self._run_batch(batch)
+        except DailyQuotaExhausted as e:
+            logging.warning(f"⛽ Quota journalier HubSpot presque épuisé, reprise au prochain passage : {e}")
+        remaining = len(self.pending())
+        if remaining:
+            logging.info(f"⏸️ Budget de temps écoulé : {remaining} journée(s) restante(s), reprise au prochain passage.")
+        self.report()
+        return remaining
+
+    def _run_batch(self, days):
+        calls, windows = {}, []
+        for day in list(days):
+            unit = self.state["units"][day]
+            unit["attempts"] += 1
+            unit["error"] = None
+            if unit.get("windows"):
+                # ⏯️ Reprise : curseurs et appels déjà reçus restaurés
+                calls[day] = self.store.load(PARTIAL_STATE.format(day=day), {})
+            else:
+                try:
+                    # 🔢 Total de la journée entière (ids distincts) : les totaux des fenêtres comptent
+                    # deux fois les appels posés exactement sur une borne de bissection
+                    expected = count_calls(self.headers, *day_bounds_ms(day))
+                    planned = plan_windows(self.headers, *day_bounds_ms(day), total=expected)
+                except Exception as e:
+                    unit["status"], unit["error"] = "failed", str(e)
+                    logging.error(f"❌ Planification de {day} impossible : {e}")
+                    days.remove(day)
+                    continue
+                # 🪟 [début, fin, total, curseur, terminée]
+                unit["windows"] = [[start, end, count, None, False] for start, end, count in planned]
+                unit["expected"] = expected
+                calls[day] = {}
+            unit["status"] = "running"
+            windows += [(w[0], w[1], w[2], w[3]) for w in unit["windows"] if not w[4]]
+        if not days:
+            self.store.save(self.state_name, self.state)
+            return
+        self._checkpoint(days, calls)
+        logging.info(f"🧵 Backfill {days[0]} → {days[-1]} : {len(windows)} fenêtre(s) à récupérer")
+
+        by_window = {(w[0], w[1]): w for day in days for w in self.state["units"][day]["windows"]}
+        last_checkpoint = [time.monotonic()]
+
+        def consume(results):
+            for call in results:
+                day = call_day(call)
+                if day in calls:
+                    merge_calls(calls[day], [call])
+
+        def on_cursor(window, after):
+            entry = by_window[(window[0], window[1])]
+            entry[3], entry[4] = after, after is None
+            if time.monotonic() - last_checkpoint[0] >= CHECKPOINT_INTERVAL_SECONDS:
+                self._checkpoint(days, calls)
+                last_checkpoint[0] = time.monotonic()
+
+        failed = fetch_windows(self.token, windows, consume, on_cursor=on_cursor, **self.engine_options)
+        quota_error, quota_days = None, set()
+        for window, error in failed:
+            day = datetime.fromtimestamp(window[0] / 1000, gmt_plus_2).strftime("%Y-%m-%d")
+            unit = self.state["units"][day]
+            unit["error"] = str(error) or type(error).__name__
+            if isinstance(error, DailyQuotaExhausted):
+                quota_error = error
+                quota_days.add(day)
+            logging.error(f"❌ Erreur fenêtre {datetime.fromtimestamp(window[0] / 1000, gmt_plus_2):%Y-%m-%d %H:%M}: {error}")
+
+        # ✅ Journées dont toutes les fenêtres sont terminées : publiées puis marquées terminées
+        published = []
+        for day in days:
+            unit = self.state["units"][day]
+            if not all(w[4] for w in unit["windows"]):
+                if day in quota_days:
+                    # 🔁 Le quota n'est pas une erreur de la journée : tentative non décomptée
+                    unit["attempts"] -= 1
+                unit["status"] = "failed"
+                continue
+            self.history.write_day(day, list(calls[day].values()), self.owner_map, self.idle_threshold)
+            unit["fetched"] = len(calls[day])
+            unit["status"] = "done" if unit["fetched"] >= unit["expected"] else "incomplete"
+            if unit["status"] == "incomplete":
+                # 🔄 Nouvelle tentative : replanification complète de la journée
+                unit["windows"] = []
+            published.append(day)
+            calls.pop(day)
+        # 🔄 Manifeste relu juste avant l'écriture : l'export rapide a pu le modifier pendant le lot
+        self.history.reload_manifest()
+        self.history.save_manifest()
+        self._checkpoint(days, calls)
+        # 🧹 Appels partiels supprimés une fois le statut enregistré : un plantage avant ce point
+        # reprend la journée avec ses appels (republiés à l'identique), jamais avec une journée vide
+        for day in published:
+            self.store.delete(PARTIAL_STATE.format(day=day))
+        if quota_error:
+            raise quota_error
+
+    # 💾 Point de reprise : statut des unités + appels déjà reçus des journées en cours
+    def _checkpoint(self, days, calls):
+        for day in days:
+            if day in calls:
+                self.store.save(PARTIAL_STATE.format(day=day), calls[day])
+        self.store.save(self.state_name, self.state)
+
+    # 📋 Rapport de complétude par journée (logs + CSV dans le conteneur de l'historique)
+    def report(self):
+        counts = {}
+        for unit in self.state["units"].values():
+            counts[unit["status"]] = counts.get(unit["status"], 0) + 1
+        logging.info(f"📋 Backfill {self.range['start']} → {self.range['end']} : "
+                     + ", ".join(f"{status} {n}" for status, n in sorted(counts.items())))
+        for day, unit in sorted(self.state["units"].items()):
+            if unit["status"] in ("failed", "incomplete") and unit["attempts"] >= MAX_ATTEMPTS:
+                logging.warning(f"⚠️ {day} abandonnée après {unit['attempts']} tentative(s) : "
+                                f"{unit.get('fetched', 0)}/{unit.get('expected', '?')} appels, {unit.get('error') or 'incomplet'}")
+
+        rows = (
+            {"Jour": day, "Statut": unit["status"], "Attendus": unit.get("expected", ""),
+             "Récupérés": unit.get("fetched", ""), "Tentatives": unit["attempts"], "Erreur": unit.get("error") or ""}
+            for day, unit in sorted(self.state["units"].items())
+        )
+        with BlobSink(self.connection_string, self.history.container, REPORT_BLOB.format(**self.range)) as out:
+            out.rows = write_csv(out, rows, REPORT_COLUMNS)
+        return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill reprenable des appels HubSpot vers l'historique partitionné")
+    parser.add_argument("--start", type=date.fromisoformat, required=True)
+    parser.add_argument("--end", type=date.fromisoformat, required=True)
+    parser.add_argument("--budget", type=int, default=24 * 3600, help="budget de temps en secondes")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    token = os.environ["HUBSPOT_TOKEN"]
+    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+    backfill = Backfill(
+        token, headers, os.environ["AZURE_STORAGE_CONNECTION_STRING"], args.start, args.end,
+        fetch_owner_map(headers),
+        idle_threshold=int(os.environ.get("SESSION_IDLE_THRESHOLD_SECONDS", "1800")),
+        per_second=float(os.environ.get("HUBSPOT_RATE_PER_SECOND", "4")),
+        max_concurrency=int(os.environ.get("HUBSPOT_MAX_CONCURRENCY", "16"))
+    )
+    sys.exit(1 if backfill.run(args.budget) else 0)
+
+
+if __name__ == "__main__":
+    main()
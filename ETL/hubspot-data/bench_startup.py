@@ -0,0 +1,69 @@
+"""
+Benchmark : démarrage à froid de l'application hubspot-data.
+
+Chaque mesure lance un interpréteur neuf (aucun module en cache) qui importe function_app,
+appelle le ping, puis importe les modules de l'export. Affiche les temps médians et vérifie
+que le ping n'a chargé aucun module lourd (pandas, numpy, aiohttp, pyarrow, azure-storage-blob).
+Usage : python bench_startup.py [--runs 10] [--importtime]
+"""
+import argparse, json, os, statistics, subprocess, sys
+
+HEAVY_MODULES = ["pandas", "numpy", "aiohttp", "pyarrow", "azure.storage.blob"]
+
+# 🧪 Exécuté dans un processus neuf : temps d'import, ping, puis chemin d'export
+PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import function_app
+t1 = time.perf_counter()
+import azure.functions as func
+response = function_app.ping(func.HttpRequest("GET", "/api/ping", body=b""))
+t2 = time.perf_counter()
+loaded = [m for m in HEAVY_MODULES if m in sys.modules]
+import history_store, fetch_engine
+t3 = time.perf_counter()
+print(json.dumps({"import_app": t1 - t0, "ping": t2 - t1, "export_modules": t3 - t2,
+                  "status": response.status_code, "loaded": loaded}))
+"""
+
+
+def probe(here):
+    code = f"HEAVY_MODULES = {HEAVY_MODULES!r}\n{PROBE}"
+    out = subprocess.run([sys.executable, "-c", code], cwd=here, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=10)
+    ap.add_argument("--importtime", action="store_true", help="détail -X importtime de l'import de function_app")
+    args = ap.parse_args()
+    here = os.path.dirname(os.path.abspath(__file__))
+
+    results = [probe(here) for _ in range(args.runs)]
+    for key, label in (("import_app", "import function_app"), ("ping", "premier ping"),
+                       ("export_modules", "modules de l'export (1er tick)")):
+        values = [r[key] * 1000 for r in results]
+        print(f"{label:<32}: médiane {statistics.median(values):7.1f} ms (min {min(values):.1f}, max {max(values):.1f})")
+
+    loaded = sorted({m for r in results for m in r["loaded"]})
+    print(f"modules lourds chargés par le ping : {', '.join(loaded) or 'aucun'}")
+
+    if args.importtime:
+        # 🔍 Les 15 imports cumulés les plus coûteux de function_app
+        out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import function_app"],
+                             cwd=here, capture_output=True, text=True, check=True)
+        rows = []
+        for line in out.stderr.splitlines():
+            if line.startswith("import time:") and "|" in line and "cumulative" not in line:
+                _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+                rows.append((int(cumulative), name))
+        for cumulative, name in sorted(rows, reverse=True)[:15]:
+            print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    if loaded or any(r["status"] != 200 for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Benchmark : transformation historique (boucles Python) vs transform.build_calls_frame.
+
+Vérifie que les deux produisent un CSV identique (hors écarts entre appels, désormais calculés
+par commercial et comparés à la boucle d'origine appliquée commercial par commercial),
+puis affiche les temps.
+Usage : python bench_transform.py [--calls 100000]
+"""
+import argparse, locale, random, time
+from datetime import date, datetime, timedelta, timezone
+import pandas as pd
+from dateutil import parser
+
+from transform import DISPOSITION_LABELS, GAP_COL, OWNER_ID_COL, build_calls_frame, export_frame
+
+gmt_plus_2 = timezone(timedelta(hours=2))
+EN_TO_FR = {"Monday": "lundi", "Tuesday": "mardi", "Wednesday": "mercredi", "Thursday": "jeudi",
+            "Friday": "vendredi", "Saturday": "samedi", "Sunday": "dimanche"}
+
+
+def synthetic_calls(n, owners, seed=42):
+    rng = random.Random(seed)
+    start = datetime(2025, 5, 15, tzinfo=timezone.utc).timestamp()
+    calls = []
+    for i in range(n):
+        ts = start + rng.uniform(0, 180 * 86400)
+        ms = rng.randint(0, 999)
+        stamp = datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+        calls.append({"id": str(10_000_000 + i), "properties": {
+            "hs_call_duration": str(rng.randint(0, 600_000)) if rng.random() > 0.05 else None,
+            "hs_call_disposition": rng.choice(list(DISPOSITION_LABELS) + [None, "autre"]),
+            "hs_timestamp": (f"{stamp}.{ms:03d}Z" if ms else f"{stamp}Z") if rng.random() > 0.01 else None,
+            "hubspot_owner_id": rng.choice(list(owners) + [None])
+        }})
+    return calls
+
+
+# 🐢 Transformation d'origine (hubspot_fast_export avant vectorisation)
+def legacy_calls_frame(all_calls, owner_map):
+    rows = []
+    for call in all_calls:
+        props = call.get("properties", {})
+        timestamp = props.get("hs_timestamp")
+        dt = parser.isoparse(timestamp).astimezone(gmt_plus_2) if timestamp else None
+        rows.append({
+            "id": call.get("id"),
+            "Durée_Secondes": int(int(props.get("hs_call_duration") or 0) / 1000),
+            "Résultat de l'appel": DISPOSITION_LABELS.get(props.get("hs_call_disposition"), "Inconnu"),
+            "Date d’activité": dt,
+            "Activité attribuée à": owner_map.get(props.get("hubspot_owner_id"), "Inconnu"),
+            OWNER_ID_COL: props.get("hubspot_owner_id")
+        })
+
+    df = pd.DataFrame(rows)
+    df["Jour"] = df["Date d’activité"].dt.strftime("%A")
+    df["Heure"] = df["Date d’activité"].dt.hour
+    df["Minute"] = df["Date d’activité"].dt.strftime("%H:%M")
+
+    DEBUTS = [(datetime.min + timedelta(hours=9, minutes=30) + timedelta(hours=i)).time() for i in range(0, 9)]
+
+    def assign_creneau(dt):
+        if pd.isna(dt):
+            return "Hors plage"
+        t = dt.time()
+        for start in DEBUTS:
+            end = (datetime.combine(date.min, start) + timedelta(hours=1)).time()
+            if start <= t < end:
+                return f"{start.hour:02d}h{start.minute:02d}-{end.hour:02d}h{end.minute:02d}"
+        return "Hors plage"
+
+    df["Créneau Horaire"] = df["Date d’activité"].apply(assign_creneau)
+
+    pause_start = datetime.strptime("12:30", "%H:%M").time()
+    pause_end = datetime.strptime("14:00", "%H:%M").time()
+    df = df.sort_values(by="Date d’activité", ascending=False).reset_index(drop=True)
+    diffs = [None]
+    for i in range(1, len(df)):
+        current = df.loc[i - 1, "Date d’activité"]
+        previous = df.loc[i, "Date d’activité"]
+        if pd.isna(current) or pd.isna(previous) or current.date() != previous.date():
+            diffs.append(None)
+            continue
+        if pause_start <= current.time() < pause_end or pause_start <= previous.time() < pause_end:
+            diffs.append(None)
+            continue
+        diffs.append((current - previous).total_seconds())
+    df["Différence entre les appels (secondes)"] = diffs
+    return df
+
+
+def legacy_gaps_per_owner(legacy):
+    """Boucle d'origine appliquée à la chronologie de chaque commercial."""
+    pause_start = datetime.strptime("12:30", "%H:%M").time()
+    pause_end = datetime.strptime("14:00", "%H:%M").time()
+    gaps = pd.Series(float("nan"), index=legacy.index)
+    for _, group in legacy.groupby(legacy[OWNER_ID_COL].fillna(""), sort=False):
+        dates = group["Date d’activité"].tolist()
+        for i in range(1, len(dates)):
+            current, previous = dates[i - 1], dates[i]
+            if pd.isna(current) or pd.isna(previous) or current.date() != previous.date():
+                continue
+            if pause_start <= current.time() < pause_end or pause_start <= previous.time() < pause_end:
+                continue
+            gaps[group.index[i]] = (current - previous).total_seconds()
+    return gaps
+
+
+def main():
+    args = argparse.ArgumentParser()
+    args.add_argument("--calls", type=int, default=100_000)
+    n = args.parse_args().calls
+
+    owners = {str(i): f"Agent {i}" for i in range(12)}
+    calls = synthetic_calls(n, owners)
+
+    try:
+        locale.setlocale(locale.LC_TIME, "fr_FR.UTF-8")
+        french = True
+    except locale.Error:
+        french = False
+
+    t0 = time.perf_counter()
+    legacy = legacy_calls_frame(calls, owners)
+    t1 = time.perf_counter()
+    vectorized = build_calls_frame(calls, owners)
+    t2 = time.perf_counter()
+
+    if not french:
+        legacy["Jour"] = legacy["Jour"].map(EN_TO_FR)
+    legacy[GAP_COL] = legacy_gaps_per_owner(legacy)
+    identical = export_frame(legacy).to_csv(index=False) == export_frame(vectorized).to_csv(index=False)
+
+    print(f"{n} appels | historique : {t1 - t0:.2f}s | vectorisé : {t2 - t1:.2f}s | "
+          f"x{(t1 - t0) / (t2 - t1):.1f} | CSV identique : {identical}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""Récupération des appels HubSpot : fenêtres adaptatives (synchro complète) et curseur hs_lastmodifieddate (synchro incrémentale)."""
+import json, logging
+from datetime import datetime, timedelta, timezone
+
+from shared import http_client
+
+SEARCH_URL = "https://api.hubapi.com/crm/v3/objects/calls/search"
+OWNERS_URL = "https://api.hubapi.com/crm/v3/owners"
+CALL_PROPERTIES = [
+    "hs_call_duration",
+    "hs_call_disposition",
+    "hs_timestamp",
+    "hubspot_owner_id",
+    "hs_lastmodifieddate"
+]
+# 🔒 L'API search refuse de paginer au-delà de 10 000 résultats par requête
+SEARCH_RESULT_CAP = 10000
+# ✂️ Planification des fenêtres : bissection au-delà de WINDOW_SPLIT_THRESHOLD appels,
+# fusion des fenêtres voisines tant que le total reste sous WINDOW_MERGE_THRESHOLD
+WINDOW_SPLIT_THRESHOLD = 9000
+WINDOW_MERGE_THRESHOLD = 5000
+MIN_WINDOW_MS = 60 * 1000
+# ⏪ Recouvrement du curseur pour absorber le délai d'indexation de la recherche HubSpot
+CURSOR_OVERLAP_MS = 5 * 60 * 1000
+
+gmt_plus_2 = timezone(timedelta(hours=2))
+
+
+def to_ms(value):
+    return int(datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp() * 1000)
+
+
+# 👤 {owner_id: "Prénom Nom"} ; dictionnaire vide (appels "Inconnu") si l'API échoue
+def fetch_owner_map(headers):
+    owner_map = {}
+    try:
+        r = http_client.get(OWNERS_URL, headers=headers)
+        r.raise_for_status()
+        for o in r.json().get("results", []):
+            owner_map[o['id']] = f"{o.get('firstName', '')} {o.get('lastName', '')}".strip()
+        logging.info(f"✅ {len(owner_map)} agents chargés depuis HubSpot")
+    except Exception as e:
+        logging.error(f"❌ Erreur récupération owners: {e}")
+    return owner_map
+
+
+def _post_search(headers, body):
+    r = http_client.post(SEARCH_URL, headers=headers, data=json.dumps(body))
+    r.raise_for_status()
+    return r.json()
+
+
+def search_calls(headers, filters, sorts=None, max_results=SEARCH_RESULT_CAP):
+    payload = {
+        "filterGroups": [{"filters": filters}],
+        "properties": CALL_PROPERTIES,
+        "limit": 100
+    }
+    if sorts:
+        payload["sorts"] = sorts
+
+    after, count = None, 0
+    while True:
+        body = dict(payload)
+        if after:
+            body["after"] = after
+        page = _post_search(headers, body)
+        for call in page.get("results", []):
+            yield call
+            count += 1
+        after = page.get("paging", {}).get("next", {}).get("after")
+        if not after or count + 100 > max_results:
+            break
+
+
+def window_filters(start_ms, end_ms):
+    return [{
+        "propertyName": "hs_timestamp",
+        "operator": "BETWEEN",
+        "value": start_ms,
+        "highValue": end_ms
+    }]
+
+
+# 🔢 Nombre d'appels d'une fenêtre (champ `total`, une seule requête)
+def count_calls(headers, start_ms, end_ms):
+    body = {"filterGroups": [{"filters": window_filters(start_ms, end_ms)}], "properties": ["hs_timestamp"], "limit": 1}
+    return _post_search(headers, body).get("total", 0)
+
+
+def plan_windows(headers, start_ms, end_ms, split_threshold=WINDOW_SPLIT_THRESHOLD,
+                 merge_threshold=WINDOW_MERGE_THRESHOLD, total=None):
+    """
+    Découpe [start_ms, end_ms] en fenêtres [(début, fin, total)] :
+    bissection récursive des fenêtres trop denses (plafond de pagination à 10 000),
+    puis fusion des fenêtres creuses adjacentes. total : nombre d'appels de la période
+    s'il est déjà connu (sinon demandé). Les bornes (BETWEEN inclusif) étant partagées
+    par deux fenêtres voisines, la somme des totaux des fenêtres peut dépasser ce total.
+    """
+    leaves = []
+
+    def bisect(start, end, total):
+        if total <= split_threshold or end - start <= MIN_WINDOW_MS:
+            if total > split_threshold:
+                logging.warning(f"⚠️ Fenêtre minimale {start}–{end} : {total} appels, résultats tronqués à {SEARCH_RESULT_CAP}.")
+            leaves.append((start, end, total))
+            return
+        mid = (start + end) // 2
+        bisect(start, mid, count_calls(headers, start, mid))
+        bisect(mid, end, count_calls(headers, mid, end))
+
+    bisect(start_ms, end_ms, count_calls(headers, start_ms, end_ms) if total is None else total)
+
+    windows = []
+    for start, end, total in leaves:
+        if windows and windows[-1][2] + total <= merge_threshold:
+            windows[-1] = (windows[-1][0], end, windows[-1][2] + total)
+        elif total or not windows:
+            windows.append((start, end, total))
+        else:
+            windows[-1] = (windows[-1][0], end, windows[-1][2])
+    return [w for w in windows if w[2]]
+
+
+def get_modified_calls(headers, since_ms, min_timestamp_ms):
+    """
+    Appels créés ou modifiés depuis since_ms (inclus), triés par hs_lastmodifieddate.
+    Au-delà du plafond de 10 000 résultats, la recherche repart du dernier
+    hs_lastmodifieddate vu (les doublons de borne sont absorbés par la fusion par id).
+    """
+    cursor = since_ms
+    while True:
+        filters = [
+            {"propertyName": "hs_lastmodifieddate", "operator": "GTE", "value": cursor},
+            {"propertyName": "hs_timestamp", "operator": "GTE", "value": min_timestamp_ms}
+        ]
+        sorts = [{"propertyName": "hs_lastmodifieddate", "direction": "ASCENDING"}]
+        count, last_modified = 0, cursor
+        for call in search_calls(headers, filters, sorts=sorts):
+            yield call
+            count += 1
+            modified = call.get("properties", {}).get("hs_lastmodifieddate")
+            if modified:
+                last_modified = max(last_modified, to_ms(modified))
+        if count < SEARCH_RESULT_CAP:
+            return
+        if last_modified == cursor:
+            logging.warning(f"⚠️ Plus de {SEARCH_RESULT_CAP} appels modifiés à {cursor} ms : reprise impossible.")
+            return
+        cursor = last_modified
+
+
+def merge_calls(calls, modified_calls, on_change=None):
+    """
+    Fusionne par id ; renvoie (nombre d'appels ajoutés/modifiés, curseur max vu en ms).
+    on_change(ancien, nouveau) est appelé pour chaque appel ajouté ou modifié (ancien=None si nouveau).
+    """
+    changed, max_modified = 0, None
+    for call in modified_calls:
+        props = call.get("properties", {})
+        modified = props.get("hs_lastmodifieddate")
+        if modified:
+            max_modified = max(max_modified or 0, to_ms(modified))
+        record = {"id": call.get("id"), "properties": props}
+        previous = calls.get(record["id"])
+        if previous != record:
+            if on_change:
+                on_change(previous, record)
+            calls[record["id"]] = record
+            changed += 1
+    return changed, max_modified
@@ -0,0 +1,204 @@
+"""Moteur asynchrone de récupération des appels HubSpot : limiteur de débit global et concurrence AIMD."""
+import asyncio, json, logging, random, time
+import aiohttp
+
+from shared import http_client
+from calls_sync import CALL_PROPERTIES, SEARCH_RESULT_CAP, SEARCH_URL, window_filters
+
+SEARCH_ENDPOINT = http_client.endpoint_key("POST", SEARCH_URL)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class DailyQuotaExhausted(Exception):
+    pass
+
+
+class RateLimiter:
+    """Espace les requêtes (limite par seconde) et s'arrête avant d'épuiser le quota journalier."""
+
+    def __init__(self, per_second=4, daily_reserve=1000):
+        self.interval = 1.0 / per_second
+        self.daily_reserve = daily_reserve
+        self.daily_remaining = None
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.daily_remaining is not None and self.daily_remaining <= self.daily_reserve:
+            raise DailyQuotaExhausted(f"quota journalier restant : {self.daily_remaining}")
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds):
+        self._next_slot = max(self._next_slot, time.monotonic() + seconds)
+
+    # 📊 En-têtes X-HubSpot-RateLimit-* : recale le limiteur sur l'état réel du compte
+    def observe(self, headers):
+        daily = headers.get("X-HubSpot-RateLimit-Daily-Remaining")
+        if daily is not None:
+            self.daily_remaining = int(daily)
+        secondly = headers.get("X-HubSpot-RateLimit-Secondly-Remaining")
+        if secondly is not None and int(secondly) <= 0:
+            self.pause(1.0)
+
+
+class AIMDConcurrency:
+    """Nombre de requêtes en vol : +1 par "tour" de succès, divisé par deux sur un 429."""
+
+    def __init__(self, initial=4, minimum=1, maximum=16):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def __aexit__(self, *exc):
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self):
+        self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+
+    def on_throttle(self):
+        # ⚖️ Une seule diminution par seconde : les 429 simultanés ne comptent qu'une fois
+        now = time.monotonic()
+        if now - self._last_decrease >= 1.0:
+            self.limit = max(self.minimum, self.limit / 2)
+            self._last_decrease = now
+
+
+class HubSpotFetchEngine:
+    def __init__(self, token, per_second=4, max_concurrency=16, max_retries=6, queue_size=64):
+        self.token = token
+        self.per_second = per_second
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.queue_size = queue_size
+        self.requests_sent = 0
+        self.throttled = 0
+
+    async def run(self, windows, consume, on_cursor=None):
+        """
+        Récupère toutes les fenêtres en parallèle ; chaque page de résultats est déposée
+        dans une file consommée par consume(résultats). Renvoie [(fenêtre, erreur)] en échec.
+
+        Une fenêtre (début, fin, total[, after]) reprend au curseur de pagination `after` s'il est fourni ;
+        on_cursor(fenêtre, after) est appelé après chaque page consommée (after=None : fenêtre terminée),
+        dans un thread (il peut écrire un point de reprise). Une erreur de consume ou de on_cursor annule
+        les fenêtres en cours et est relevée par run().
+        """
+        # 🧱 Objets asyncio créés dans la boucle courante
+        self.limiter = RateLimiter(self.per_second)
+        self.concurrency = AIMDConcurrency(maximum=self.max_concurrency)
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        failure = []
+
+        async def consumer(producers):
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                if failure:
+                    continue  # 🚰 file vidée jusqu'à la fin : aucun producteur ne reste bloqué sur put()
+                window, results, after = item
+                try:
+                    consume(results)
+                    if on_cursor:
+                        await asyncio.to_thread(on_cursor, window, after)
+                except Exception as e:
+                    logging.error(f"❌ Consommation des résultats en échec : {e} — fenêtres annulées")
+                    failure.append(e)
+                    for task in producers:
+                        task.cancel()
+
+        headers = {"Authorization": f"Bearer {self.token}", "Content-Type": "application/json"}
+        timeout = aiohttp.ClientTimeout(total=60)
+        async with aiohttp.ClientSession(headers=headers, timeout=timeout) as session:
+            producers = [asyncio.create_task(self._fetch_window(session, window, queue)) for window in windows]
+            consumer_task = asyncio.create_task(consumer(producers))
+            outcomes = await asyncio.gather(*producers, return_exceptions=True)
+        await queue.put(None)
+        await consumer_task
+
+        logging.info(f"📡 {self.requests_sent} requête(s), {self.throttled} 429, "
+                     f"concurrence finale {self.concurrency.limit:.1f}")
+        if failure:
+            raise failure[0]
+        return [(window, outcome) for window, outcome in zip(windows, outcomes) if isinstance(outcome, Exception)]
+
+    async def _fetch_window(self, session, window, queue):
+        start_ms, end_ms = window[0], window[1]
+        payload = {
+            "filterGroups": [{"filters": window_filters(start_ms, end_ms)}],
+            "properties": CALL_PROPERTIES,
+            "limit": 100
+        }
+        after = window[3] if len(window) > 3 else None
+        # 🔢 Le curseur de la recherche HubSpot est un décalage : il tient lieu de compteur à la reprise
+        count = int(after) if after and str(after).isdigit() else 0
+        while True:
+            body = dict(payload)
+            if after:
+                body["after"] = after
+            page = await self._post(session, body)
+            results = page.get("results", [])
+            count += len(results)
+            after = page.get("paging", {}).get("next", {}).get("after")
+            if not after or count + 100 > SEARCH_RESULT_CAP:
+                await queue.put((window, results, None))
+                return count
+            await queue.put((window, results, after))
+
+    async def _post(self, session, body):
+        # 🔁 Compteur de tentatives propre à chaque requête ; coupures réseau et timeouts retentés comme
+        # dans shared/http_client.request (backoff exponentiel avec jitter)
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire()
+            async with self.concurrency:
+                self.requests_sent += 1
+                started = time.perf_counter()
+                try:
+                    async with session.post(SEARCH_URL, json=body) as resp:
+                        content = await resp.read()
+                        retry = resp.status in RETRY_STATUSES and attempt < self.max_retries
+                        http_client.record(SEARCH_ENDPOINT, resp.status, len(content), time.perf_counter() - started, retry=retry)
+                        self.limiter.observe(resp.headers)
+                        if resp.status == 200:
+                            self.concurrency.on_success()
+                            return json.loads(content)
+                        if not retry:
+                            resp.raise_for_status()
+                        if resp.status == 429:
+                            self.throttled += 1
+                            self.concurrency.on_throttle()
+                        try:
+                            wait = float(resp.headers["Retry-After"])
+                        except (KeyError, ValueError):
+                            wait = min(60, 2 ** attempt) + random.uniform(0, 1)
+                except aiohttp.ClientResponseError:
+                    raise
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    http_client.record(SEARCH_ENDPOINT, None, 0, time.perf_counter() - started,
+                                       retry=attempt < self.max_retries)
+                    if attempt == self.max_retries:
+                        raise
+                    wait = http_client.retry_delay(None, attempt)
+                    logging.warning(f"🔁 {SEARCH_ENDPOINT} : {type(e).__name__} {e} — nouvelle tentative dans {wait:.1f}s")
+                self.limiter.pause(wait)
+        raise RuntimeError("nombre maximal de tentatives atteint")
+
+
+def fetch_windows(token, windows, consume, on_cursor=None, **kwargs):
+    return asyncio.run(HubSpotFetchEngine(token, **kwargs).run(windows, consume, on_cursor))
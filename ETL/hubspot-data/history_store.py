@@ -0,0 +1,222 @@
+"""Historique des appels partitionné par jour : calls/year=/month=/day= (et sessions/…), avec manifeste.
+
+Les écarts entre appels et les sessions ne franchissent jamais un changement de jour :
+chaque partition se calcule donc seule, et seules les journées touchées sont réécrites.
+Une journée est "close" au-delà de HISTORY_OPEN_DAYS ; une modification tardive la rouvre
+(réécriture signalée dans les logs) plutôt que d'être perdue.
+
+Le manifeste est écrit par l'export rapide et par le backfill historique, sous des baux distincts :
+chaque écriture fusionne les entrées du processus dans la dernière version du blob, à condition
+que son ETag n'ait pas changé entre-temps (sinon relecture et nouvelle fusion).
+
+Côté état, les appels bruts de l'export rapide sont eux aussi rangés par journée (CallDays) :
+un passage incrémental ne relit et ne réenregistre que les journées touchées, plus un index id → jour.
+"""
+import json, logging, os
+from datetime import datetime, timedelta, timezone
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceExistsError, ResourceModifiedError, ResourceNotFoundError
+from azure.storage.blob import BlobServiceClient, ContentSettings
+
+from shared.blob_sink import BlobSink
+from shared.parquet_export import write_frame
+from calls_sync import gmt_plus_2
+from sessions import SESSIONS_PARQUET_TYPES, build_sessions
+from transform import CALLS_PARQUET_TYPES, DATE_COL, build_calls_frame, export_frame
+
+HISTORY_CONTAINER = os.environ.get("HUBSPOT_HISTORY_CONTAINER", "hubspot-data")
+MANIFEST = "_manifest.json"
+HISTORY_OPEN_DAYS = int(os.environ.get("HISTORY_OPEN_DAYS", "2"))
+UNDATED = "undated"
+MANIFEST_MAX_ATTEMPTS = 10
+CALL_INDEX_STATE = "hubspot/call_days.json.gz"
+CALL_DAY_STATE_PREFIX = "hubspot/calls/"
+
+
+# 📅 Journée (GMT+2) d'un appel, ou None sans hs_timestamp
+def call_day(call):
+    stamp = (call or {}).get("properties", {}).get("hs_timestamp")
+    if not stamp:
+        return None
+    return datetime.fromisoformat(stamp.replace("Z", "+00:00")).astimezone(gmt_plus_2).strftime("%Y-%m-%d")
+
+
+def partition_path(dataset, day, ext="csv"):
+    if day is None:
+        return f"{dataset}/{UNDATED}/{dataset}.{ext}"
+    year, month, dom = day.split("-")
+    return f"{dataset}/year={year}/month={month}/day={dom}/{dataset}.{ext}"
+
+
+def group_by_day(calls, days=None):
+    """{jour: [appels]} ; limité aux journées de `days` si fourni."""
+    grouped = {}
+    for call in calls:
+        day = call_day(call)
+        if days is None or day in days:
+            grouped.setdefault(day, []).append(call)
+    return grouped
+
+
+class HistoryStore:
+    def __init__(self, connection_string, container=HISTORY_CONTAINER):
+        self.connection_string = connection_string
+        self.container = container
+        blob_service = BlobServiceClient.from_connection_string(connection_string)
+        self.manifest_blob = blob_service.get_blob_client(container, MANIFEST)
+        self._written = {}  # 🧾 entrées écrites par ce processus, fusionnées à chaque sauvegarde
+        self.reload_manifest()
+
+    def reload_manifest(self):
+        """Relit le manifeste publié (et son ETag) ; les entrées écrites ici et non encore sauvegardées priment."""
+        try:
+            download = self.manifest_blob.download_blob()
+            self.manifest, self._etag = json.loads(download.readall()), download.properties.etag
+        except ResourceNotFoundError:
+            self.manifest, self._etag = {"partitions": {}}, None
+        self.manifest["partitions"].update(self._written)
+
+    def days(self):
+        return {None if day == UNDATED else day for day in self.manifest["partitions"]}
+
+    # ✍️ Réécriture d'une journée (appels + sessions) ; le manifeste est mis à jour en mémoire
+    def write_day(self, day, calls, owner_map, idle_threshold):
+        key = day or UNDATED
+        today = datetime.now(gmt_plus_2).date()
+        closed = day is not None and datetime.strptime(day, "%Y-%m-%d").date() < today - timedelta(days=HISTORY_OPEN_DAYS)
+        # 🗑️ Une journée vidée (appels supprimés) est réécrite avec l'en-tête seul
+        df = build_calls_frame(calls, owner_map)
+        sessions = build_sessions(df, idle_threshold=idle_threshold)
+        export = export_frame(df)
+
+        changed = False
+        for dataset, frame, types in (("calls", export, CALLS_PARQUET_TYPES), ("sessions", sessions, SESSIONS_PARQUET_TYPES)):
+            with BlobSink(self.connection_string, self.container, partition_path(dataset, day), encoding="utf-8-sig") as out:
+                out.rows = len(frame)
+                frame.to_csv(out, index=False)
+            changed |= out.changed
+            write_frame(self.connection_string, self.container, partition_path(dataset, day, "parquet"), frame, types)
+
+        previous = self.manifest["partitions"].get(key, {})
+        if changed and previous.get("closed"):
+            logging.info(f"♻️ Journée close {day} rouverte par une modification tardive.")
+
+        dates = export[DATE_COL].dropna()
+        self._written[key] = self.manifest["partitions"][key] = {
+            "calls": partition_path("calls", day),
+            "sessions": partition_path("sessions", day),
+            "rows": len(export),
+            "sessions_rows": len(sessions),
+            "min_timestamp": dates.min().isoformat() if len(dates) else None,
+            "max_timestamp": dates.max().isoformat() if len(dates) else None,
+            "closed": closed,
+            "updated_at": datetime.now(timezone.utc).isoformat(timespec="seconds") if changed else previous.get("updated_at"),
+        }
+        return changed
+
+    def write_days(self, grouped, owner_map, idle_threshold):
+        rewritten = sum(self.write_day(day, calls, owner_map, idle_threshold) for day, calls in grouped.items())
+        logging.info(f"🗂️ {len(grouped)} partition(s) traitée(s), {rewritten} réécrite(s).")
+        return rewritten
+
+    # 🔒 Écriture conditionnelle (ETag) : sur conflit (412), relecture, fusion des entrées de ce processus, nouvel essai
+    def save_manifest(self):
+        for _ in range(MANIFEST_MAX_ATTEMPTS):
+            partitions = dict(sorted(self.manifest["partitions"].items()))
+            manifest = {"partitions": partitions, "rows": sum(p["rows"] for p in partitions.values())}
+            data = json.dumps(manifest, ensure_ascii=False, indent=1).encode("utf-8")
+            condition = ({"etag": self._etag, "match_condition": MatchConditions.IfNotModified}
+                         if self._etag else {})
+            try:
+                result = self.manifest_blob.upload_blob(
+                    data, overwrite=bool(self._etag), content_settings=ContentSettings(content_type="application/json"),
+                    **condition
+                )
+            except (ResourceModifiedError, ResourceExistsError):
+                logging.info("🔁 Manifeste modifié par un autre export : relecture et fusion.")
+                self.reload_manifest()
+                continue
+            self.manifest, self._etag, self._written = manifest, result["etag"], {}
+            return
+        raise RuntimeError(f"Manifeste '{MANIFEST}' : écriture en conflit après {MANIFEST_MAX_ATTEMPTS} tentatives")
+
+
+def call_day_state(day):
+    return f"{CALL_DAY_STATE_PREFIX}{day or UNDATED}.json.gz"
+
+
+class CallDays:
+    """
+    Appels bruts de l'export rapide, un état par journée (etl-state/hubspot/calls/<jour>.json.gz)
+    et un index {id: jour} : seules les journées touchées sont chargées, régénérées et réenregistrées.
+    S'utilise comme le dictionnaire {id: appel} attendu par merge_calls (get / affectation).
+    """
+
+    def __init__(self, store, index=None):
+        self.store = store
+        self.index = store.load(CALL_INDEX_STATE) if index is None else index
+        self.loaded = {}      # {jour: {id: appel}} des journées lues ou modifiées
+        self.touched = set()  # journées à régénérer et à réenregistrer
+        self._index_changed = False
+
+    @classmethod
+    def from_calls(cls, store, calls):
+        """Synchro complète : toutes les journées sont reconstruites à partir des appels récupérés (états précédents ignorés)."""
+        days = cls(store, index={})
+        for call_id, record in calls.items():
+            day = call_day(record)
+            days.index[call_id] = day
+            days.loaded.setdefault(day, {})[call_id] = record
+        days.touched = set(days.loaded)
+        days._index_changed = True
+        return days
+
+    def __len__(self):
+        return len(self.index)
+
+    def day(self, day):
+        if day not in self.loaded:
+            self.loaded[day] = self.store.load(call_day_state(day), {})
+        return self.loaded[day]
+
+    def get(self, call_id):
+        if call_id not in self.index:
+            return None
+        return self.day(self.index[call_id]).get(call_id)
+
+    # 📅 Journée de la nouvelle version touchée et, si l'appel a été déplacé, celle de l'ancienne
+    def __setitem__(self, call_id, record):
+        day = call_day(record)
+        if call_id not in self.index or self.index[call_id] != day:
+            if call_id in self.index:
+                previous_day = self.index[call_id]
+                self.day(previous_day).pop(call_id, None)
+                self.touched.add(previous_day)
+            self.index[call_id] = day
+            self._index_changed = True
+        self.day(day)[call_id] = record
+        self.touched.add(day)
+
+    # 🗑️ Synchro complète : journées connues sans plus aucun appel, vidées
+    def clear_missing(self, days):
+        for day in days:
+            if day not in self.loaded:
+                self.loaded[day] = {}
+                self.touched.add(day)
+
+    def grouped(self):
+        """{jour: [appels]} des journées touchées."""
+        return {day: list(self.day(day).values()) for day in self.touched}
+
+    # 💾 Après un upload réussi : journées touchées puis index (une journée vide supprime son état)
+    def save(self):
+        for day in self.touched:
+            calls = self.day(day)
+            if calls:
+                self.store.save(call_day_state(day), calls)
+            else:
+                self.store.delete(call_day_state(day))
+        if self._index_changed:
+            self.store.save(CALL_INDEX_STATE, self.index)
+            self._index_changed = False
+        self.touched = set()
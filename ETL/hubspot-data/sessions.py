@@ -0,0 +1,70 @@
+"""Sessionisation des appels par commercial : sessions de travail et statistiques associées."""
+import numpy as np
+import pandas as pd
+
+from transform import DATE_COL, OWNER_ID_COL, PAUSE_DEBUT, PAUSE_FIN, _total_seconds, seconds_of_day
+
+OWNER_NAME_COL = "Activité attribuée à"
+DURATION_COL = "Durée_Secondes"
+# 💤 Au-delà de cet écart entre deux appels, une nouvelle session commence
+IDLE_THRESHOLD_SECONDS = 30 * 60
+
+# 🧱 Types de l'export Parquet des sessions
+SESSIONS_PARQUET_TYPES = {
+    "hubspot_owner_id": "string",
+    "Commercial": "category",
+    "Date": "date",
+    "Session": "int",
+    "Début": "timestamptz",
+    "Fin": "timestamptz",
+    "Appels": "int",
+    "Temps_parole_secondes": "int",
+    "Temps_inactif_secondes": "float",
+    "Plus_long_écart_secondes": "float",
+    "Durée_session_secondes": "float",
+}
+
+
+def build_sessions(calls, idle_threshold=IDLE_THRESHOLD_SECONDS):
+    """
+    Découpe la chronologie de chaque commercial en sessions (coupure sur changement de jour,
+    pause déjeuner ou inactivité > idle_threshold) et renvoie une ligne par session.
+    Tri + opérations vectorielles : O(n log n), sans boucle Python.
+    """
+    df = calls.loc[calls[DATE_COL].notna(), [OWNER_ID_COL, OWNER_NAME_COL, DATE_COL, DURATION_COL]]
+    df = df.assign(_owner=df[OWNER_ID_COL].fillna("")).sort_values(["_owner", DATE_COL], kind="mergesort")
+
+    ts = df[DATE_COL]
+    tod = seconds_of_day(ts)
+    # 🍽️ 0 = matin, 1 = pause déjeuner, 2 = après-midi
+    demi_journee = pd.Series(np.select([tod < PAUSE_DEBUT, tod >= PAUSE_FIN], [0, 2], default=1), index=df.index)
+    jour = ts.dt.normalize()
+    ecart = _total_seconds(ts - ts.shift(1))
+
+    nouvelle = (
+        df["_owner"].ne(df["_owner"].shift(1))
+        | jour.ne(jour.shift(1))
+        | demi_journee.ne(demi_journee.shift(1))
+        | (ecart > idle_threshold)
+    )
+    ecart = ecart.where(~nouvelle)
+    inactif = (ecart - df[DURATION_COL].shift(1)).clip(lower=0).where(~nouvelle)
+    fin_appel = ts + pd.to_timedelta(df[DURATION_COL], unit="s")
+
+    sessions = df.assign(
+        _session=nouvelle.cumsum(), _ecart=ecart, _inactif=inactif, _fin=fin_appel
+    ).groupby("_session").agg(
+        hubspot_owner_id=(OWNER_ID_COL, "first"),
+        Commercial=(OWNER_NAME_COL, "first"),
+        Début=(DATE_COL, "min"),
+        Fin=("_fin", "max"),
+        Appels=(DATE_COL, "size"),
+        Temps_parole_secondes=(DURATION_COL, "sum"),
+        Temps_inactif_secondes=("_inactif", "sum"),
+        Plus_long_écart_secondes=("_ecart", "max")
+    ).reset_index(drop=True)
+
+    sessions.insert(2, "Date", sessions["Début"].dt.strftime("%Y-%m-%d"))
+    sessions.insert(3, "Session", sessions.groupby([sessions["hubspot_owner_id"].fillna(""), "Date"]).cumcount() + 1)
+    sessions["Durée_session_secondes"] = _total_seconds(sessions["Fin"] - sessions["Début"])
+    return sessions
@@ -0,0 +1,116 @@
+"""Transformation vectorisée des appels HubSpot en table d'export (sans boucle Python ni locale)."""
+from datetime import timedelta, timezone
+import numpy as np
+import pandas as pd
+
+gmt_plus_2 = timezone(timedelta(hours=2))
+
+DATE_COL = "Date d’activité"
+OWNER_ID_COL = "hubspot_owner_id"
+GAP_COL = "Différence entre les appels (secondes)"
+
+DISPOSITION_LABELS = {
+    "a4c4c377-d246-4b32-a13b-75a56a4cd0ff": "A laissé un message en direct",
+    "b2cf5968-551e-4856-9783-52b3da59a7d0": "A laissé un message vocal",
+    "73a0d17f-1163-4015-bdd5-ec830791da20": "Aucune réponse",
+    "f240bbac-87c9-4f6e-bf70-924b57d47db7": "Connecté",
+    "17b47fee-58de-441e-a44c-c6300d46f273": "Mauvais numéro",
+    "9d9162e7-6cf3-4944-bf63-4dff82258764": "Occupé"
+}
+
+# 🗓️ Tables de correspondance (indépendantes de la locale du processus)
+JOURS = np.array(["lundi", "mardi", "mercredi", "jeudi", "vendredi", "samedi", "dimanche"], dtype=object)
+MINUTES = np.array([f"{h:02d}:{m:02d}" for h in range(24) for m in range(60)], dtype=object)
+
+# ⏰ Créneaux d'1h de 09h30-10h30 à 17h30-18h30 (bornes en secondes depuis minuit)
+CRENEAU_BORNES = np.array([(9 * 60 + 30 + 60 * i) * 60 for i in range(10)])
+CRENEAUX = np.array([f"{9 + i:02d}h30-{10 + i:02d}h30" for i in range(9)], dtype=object)
+HORS_PLAGE = "Hors plage"
+
+# 🍽️ Pause déjeuner : 12h30 (incluse) → 14h00 (exclue)
+PAUSE_DEBUT = (12 * 60 + 30) * 60
+PAUSE_FIN = 14 * 60 * 60
+
+# 🧱 Types de l'export Parquet (commercial, résultat, jour et créneau encodés en dictionnaire)
+CALLS_PARQUET_TYPES = {
+    "id": "string",
+    "Durée_Secondes": "int",
+    "Résultat de l'appel": "category",
+    DATE_COL: "timestamptz",
+    "Activité attribuée à": "category",
+    "Jour": "category",
+    "Heure": "int",
+    "Minute": "category",
+    "Créneau Horaire": "category",
+    GAP_COL: "float",
+}
+
+
+def _lookup(codes, table):
+    out = pd.Series(np.nan, index=codes.index, dtype=object)
+    valid = codes.notna()
+    out[valid] = table[codes[valid].astype("int64").to_numpy()]
+    return out
+
+
+def _total_seconds(delta):
+    # 🎯 Secondes entières + microsecondes / 1e6 : même arrondi que Timedelta.total_seconds()
+    micros = delta.to_numpy(dtype="timedelta64[us]").astype("int64")
+    seconds, rest = np.divmod(micros, 1_000_000)
+    return pd.Series(seconds + rest / 1e6, index=delta.index).where(delta.notna())
+
+
+def seconds_of_day(activite):
+    return (activite - activite.dt.normalize()).dt.total_seconds()
+
+
+def assign_creneaux(activite):
+    """Créneau horaire de chaque appel, ou "Hors plage" (y compris date manquante)."""
+    slot = np.searchsorted(CRENEAU_BORNES, seconds_of_day(activite).to_numpy(), side="right") - 1
+    in_range = (slot >= 0) & (slot < len(CRENEAUX))
+    return np.where(in_range, CRENEAUX[np.clip(slot, 0, len(CRENEAUX) - 1)], HORS_PLAGE)
+
+
+def inter_call_gaps(activite, owner):
+    """
+    Écart en secondes avec l'appel précédent du même commercial (série triée par date
+    décroissante) ; vide si l'une des deux dates manque, change de jour ou tombe pendant la pause.
+    """
+    tod = seconds_of_day(activite)
+    en_pause = (tod >= PAUSE_DEBUT) & (tod < PAUSE_FIN)
+    jour = activite.dt.normalize()
+    # 👤 Chronologie propre à chaque commercial (les appels sans propriétaire forment la leur)
+    groupes = owner.fillna("")
+    jour_voisin = jour.groupby(groupes, sort=False).shift(1)
+    pause_voisine = en_pause.groupby(groupes, sort=False).shift(1, fill_value=False).astype(bool)
+    valide = jour.eq(jour_voisin) & ~en_pause & ~pause_voisine
+    return _total_seconds(activite.groupby(groupes, sort=False).shift(1) - activite).where(valide)
+
+
+def build_calls_frame(all_calls, owner_map):
+    props = pd.DataFrame([call.get("properties", {}) for call in all_calls]).reindex(
+        columns=["hs_call_duration", "hs_call_disposition", "hs_timestamp", "hubspot_owner_id"]
+    )
+    activite = pd.to_datetime(props["hs_timestamp"], utc=True, format="ISO8601").dt.tz_convert(gmt_plus_2)
+
+    df = pd.DataFrame({
+        "id": [call.get("id") for call in all_calls],
+        "Durée_Secondes": (pd.to_numeric(props["hs_call_duration"], errors="coerce").fillna(0) / 1000).astype("int64"),
+        "Résultat de l'appel": props["hs_call_disposition"].map(DISPOSITION_LABELS).fillna("Inconnu"),
+        DATE_COL: activite,
+        "Activité attribuée à": props["hubspot_owner_id"].map(owner_map).fillna("Inconnu"),
+        OWNER_ID_COL: props["hubspot_owner_id"]
+    })
+    df["Jour"] = _lookup(activite.dt.dayofweek, JOURS)
+    df["Heure"] = activite.dt.hour
+    df["Minute"] = _lookup(activite.dt.hour * 60 + activite.dt.minute, MINUTES)
+    df["Créneau Horaire"] = assign_creneaux(activite)
+
+    df = df.sort_values(by=DATE_COL, ascending=False).reset_index(drop=True)
+    df[GAP_COL] = inter_call_gaps(df[DATE_COL], df[OWNER_ID_COL])
+    return df
+
+
+# 📤 Colonnes exportées dans le CSV (l'id propriétaire reste interne)
+def export_frame(df):
+    return df.drop(columns=[OWNER_ID_COL])
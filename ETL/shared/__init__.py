@@ -0,0 +1 @@
+"""Modules communs aux fonctions ETL (Notion, HubSpot, Azure Blob)."""
@@ -0,0 +1,160 @@
+"""Sortie en flux vers Azure Blob : le CSV encodé est découpé en blocs envoyés en parallèle.
+
+Les blocs sont déposés (stage_block) au fil de l'écriture puis validés en une seule fois
+(commit_block_list) : tant que la liste n'est pas validée, les lecteurs (Power BI) voient
+l'ancienne version complète du fichier. En cas d'erreur, rien n'est validé et Azure
+supprime les blocs orphelins d'elle-même.
+
+Une empreinte SHA-256 du contenu est calculée au fil de l'écriture et stockée dans les
+métadonnées du blob : si elle est identique à celle du blob existant, rien n'est validé
+(date de modification inchangée, pas de rafraîchissement Power BI inutile). Un fichier
+tenant dans un seul bloc n'est même pas envoyé.
+"""
+import base64, codecs, hashlib, logging, os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from azure.core.exceptions import ResourceExistsError, ResourceNotFoundError
+from azure.storage.blob import BlobServiceClient, ContentSettings
+
+HASH_METADATA_KEY = "content_sha256"
+ROWS_METADATA_KEY = "rows"
+
+BLOCK_SIZE = int(float(os.environ.get("BLOB_BLOCK_SIZE_MB", "4")) * 1024 * 1024)
+MAX_CONCURRENCY = int(os.environ.get("BLOB_UPLOAD_CONCURRENCY", "4"))
+
+
+class BlobSink:
+    """
+    Fichier en écriture seule adossé à un blob de blocs : texte (csv.writer, DataFrame.to_csv)
+    encodé selon encoding, ou binaire si encoding=None (ex. Parquet).
+    """
+
+    def __init__(self, connection_string, container, blob_name, encoding="utf-8",
+                 block_size=BLOCK_SIZE, max_concurrency=MAX_CONCURRENCY, content_type="text/csv"):
+        blob_service = BlobServiceClient.from_connection_string(connection_string)
+        self.container = blob_service.get_container_client(container)
+        self.blob = self.container.get_blob_client(blob_name)
+        self.blob_name = blob_name
+        self.encoding = encoding
+        self.block_size = block_size
+        self.max_concurrency = max(1, max_concurrency)
+        self.content_type = (f"{content_type}; charset={codecs.lookup(encoding).name.replace('-sig', '')}"
+                             if encoding else content_type)
+        self.bytes_written = 0
+        self.rows = None  # renseigné par l'appelant (nombre de lignes) pour les métadonnées et les logs
+        self.changed = None
+        self.previous = None
+        self._hash = hashlib.sha256()
+        self._encoder = codecs.getincrementalencoder(encoding)() if encoding else None
+        self._buffer = bytearray()
+        self._block_ids = []
+        self._pending = set()
+        self._executor = None
+
+    def __enter__(self):
+        # 🔎 Empreinte, nombre de lignes et taille de la version actuellement publiée
+        try:
+            props = self.blob.get_blob_properties()
+            self.previous = {"hash": props.metadata.get(HASH_METADATA_KEY), "size": props.size,
+                             "rows": props.metadata.get(ROWS_METADATA_KEY)}
+        except ResourceNotFoundError as e:
+            self.previous = None
+            if getattr(e, "error_code", None) != "BlobNotFound":
+                self._ensure_container()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+        return self
+
+    # 🆕 Premier passage : le conteneur de sortie n'existe pas encore (sinon stage_block échoue)
+    def _ensure_container(self):
+        try:
+            self.container.create_container()
+            logging.info(f"🆕 Conteneur '{self.container.container_name}' créé.")
+        except ResourceExistsError:
+            pass
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.commit()
+            else:
+                logging.warning(f"⚠️ Écriture de '{self.blob_name}' interrompue : version précédente conservée.")
+        finally:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+        return False
+
+    # ✍️ Interface fichier (texte ou binaire)
+    def write(self, text):
+        data = self._encoder.encode(text) if self._encoder else bytes(text)
+        self._hash.update(data)
+        self._buffer += data
+        self.bytes_written += len(data)
+        while len(self._buffer) >= self.block_size:
+            self._stage(bytes(self._buffer[:self.block_size]))
+            del self._buffer[:self.block_size]
+        return len(text)
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self.bytes_written
+
+    @property
+    def closed(self):
+        return False
+
+    def flush(self):
+        pass
+
+    # 📦 Dépôt d'un bloc ; au plus max_concurrency blocs en vol (mémoire bornée)
+    def _stage(self, data):
+        if len(self._pending) >= self.max_concurrency:
+            done, self._pending = wait(self._pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                future.result()
+        block_id = base64.b64encode(f"{len(self._block_ids):08d}".encode()).decode()
+        self._block_ids.append(block_id)
+        self._pending.add(self._executor.submit(self.blob.stage_block, block_id, data, length=len(data)))
+
+    # ✅ Validation atomique de la liste de blocs (remplace le blob existant en une opération)
+    def commit(self):
+        tail = self._encoder.encode("", final=True) if self._encoder else b""
+        self._hash.update(tail)
+        self._buffer += tail
+        self.bytes_written += len(tail)
+        digest = self._hash.hexdigest()
+
+        if self.previous and self.previous["hash"] == digest:
+            # ⏭️ Contenu identique : blocs déjà déposés abandonnés (jamais validés), blob intact
+            self.changed = False
+            for future in self._pending:
+                future.result()
+            self._pending.clear()
+            logging.info(f"⏭️ '{self.blob_name}' inchangé ({self.bytes_written} octets, sha256 {digest[:12]}) : upload ignoré.")
+            return
+
+        if self._buffer:
+            self._stage(bytes(self._buffer))
+            self._buffer.clear()
+        for future in self._pending:
+            future.result()
+        self._pending.clear()
+        metadata = {HASH_METADATA_KEY: digest}
+        if self.rows is not None:
+            metadata[ROWS_METADATA_KEY] = str(self.rows)
+        self.blob.commit_block_list(
+            self._block_ids, content_settings=ContentSettings(content_type=self.content_type), metadata=metadata
+        )
+        self.changed = True
+        logging.info(f"📤 '{self.blob_name}' mis à jour : {len(self._block_ids)} bloc(s), {self._delta_summary()}.")
+
+    # 📊 Écarts avec la version précédente (lignes, octets)
+    def _delta_summary(self):
+        if not self.previous:
+            return f"{self.rows if self.rows is not None else '?'} ligne(s), {self.bytes_written} octets (nouveau fichier)"
+        parts = []
+        if self.rows is not None:
+            previous_rows = self.previous["rows"]
+            delta = f"{self.rows - int(previous_rows):+d}" if previous_rows is not None else "?"
+            parts.append(f"{self.rows} ligne(s) ({delta})")
+        parts.append(f"{self.bytes_written} octets ({self.bytes_written - self.previous['size']:+d})")
+        return ", ".join(parts)
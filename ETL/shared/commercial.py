@@ -0,0 +1,12 @@
+"""Normalisation des noms de commerciaux : clé de jointure commune à HubSpot et Notion."""
+import re, unicodedata
+
+_SEPARATEURS = re.compile(r"[\s\-'’.]+")
+
+
+def normalize_commercial_name(name):
+    """« Élodie  Martin-Durand » → « elodie martin durand » (accents, casse, tirets, espaces) ; vide si absent."""
+    if not isinstance(name, str):
+        return ""
+    name = "".join(c for c in unicodedata.normalize("NFKD", name) if not unicodedata.combining(c))
+    return _SEPARATEURS.sub(" ", name).strip().casefold()
@@ -0,0 +1,13 @@
+"""Écriture CSV en flux : les lignes sont consommées une à une, sans liste intermédiaire."""
+import csv
+
+
+# 📁 Écrit un itérable de lignes (dict) dans un flux texte avec un schéma de colonnes fixe, renvoie le nombre de lignes
+def write_csv(stream, rows, fieldnames):
+    writer = csv.DictWriter(stream, fieldnames=fieldnames)
+    writer.writeheader()
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    return count
@@ -0,0 +1,134 @@
+"""
+Client HTTP commun : session keep-alive à l'échelle du module (réutilisée entre les
+exécutions à chaud), timeouts, politique de retry unifiée et métriques par endpoint.
+"""
+import functools, logging, random, re, threading, time
+from collections import defaultdict
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+
+# ⏱️ (connexion, lecture) en secondes
+DEFAULT_TIMEOUT = (5, 30)
+MAX_RETRIES = 5
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+POOL_SIZE = 32
+
+_session = None
+_session_lock = threading.Lock()
+_metrics = defaultdict(lambda: {"requests": 0, "errors": 0, "retries": 0, "bytes": 0, "seconds": 0.0, "max_seconds": 0.0})
+_metrics_lock = threading.Lock()
+
+# 🔢 Les identifiants (UUID Notion, ids numériques HubSpot) sont regroupés dans les métriques
+_ID_PATTERN = re.compile(r"/(?:[0-9a-f]{8}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{12}|\d+)(?=/|$)")
+
+
+def get_session():
+    """Session partagée : connexions TCP/TLS réutilisées, gzip négocié par défaut (Accept-Encoding)."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+def endpoint_key(method, url):
+    parts = urlsplit(url)
+    return f"{method} {parts.netloc}{_ID_PATTERN.sub('/{id}', parts.path)}"
+
+
+def record(endpoint, status, size, seconds, retry=False):
+    with _metrics_lock:
+        m = _metrics[endpoint]
+        m["requests"] += 1
+        m["bytes"] += size
+        m["seconds"] += seconds
+        m["max_seconds"] = max(m["max_seconds"], seconds)
+        if status is None or status >= 400:
+            m["errors"] += 1
+        if retry:
+            m["retries"] += 1
+
+
+def retry_delay(response, attempt):
+    """
+    Délai avant nouvelle tentative : Retry-After s'il est fourni, sinon backoff exponentiel ; jitter dans
+    les deux cas, pour que les requêtes parallèles (bases, plages) ne repartent pas toutes au même instant.
+    """
+    try:
+        return float(response.headers["Retry-After"]) + random.uniform(0, 1)
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return min(30, 2 ** attempt) + random.uniform(0, 1)
+
+
+def request(method, url, retries=MAX_RETRIES, throttle=None, timeout=DEFAULT_TIMEOUT, **kwargs):
+    """
+    Requête via la session partagée. Les erreurs transitoires (429, 5xx, coupures réseau)
+    sont retentées ; la dernière réponse est renvoyée telle quelle (à l'appelant de
+    vérifier le statut). throttle : objet optionnel exposant acquire() et pause(secondes).
+    """
+    session = get_session()
+    endpoint = endpoint_key(method, url)
+    for attempt in range(retries + 1):
+        if throttle:
+            throttle.acquire()
+        started = time.perf_counter()
+        try:
+            response = session.request(method, url, timeout=timeout, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            record(endpoint, None, 0, time.perf_counter() - started, retry=attempt < retries)
+            if attempt == retries:
+                raise
+            wait = retry_delay(None, attempt)
+            logging.warning(f"🔁 {endpoint} : {e} — nouvelle tentative dans {wait:.1f}s")
+        else:
+            retry = response.status_code in RETRY_STATUSES and attempt < retries
+            record(endpoint, response.status_code, len(response.content), time.perf_counter() - started, retry=retry)
+            if not retry:
+                return response
+            wait = retry_delay(response, attempt)
+            logging.warning(f"🔁 {endpoint} : HTTP {response.status_code} — nouvelle tentative dans {wait:.1f}s")
+        if throttle:
+            throttle.pause(wait)
+        else:
+            time.sleep(wait)
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+
+def metrics_snapshot(reset=False):
+    with _metrics_lock:
+        snapshot = {k: dict(v) for k, v in _metrics.items()}
+        if reset:
+            _metrics.clear()
+    return snapshot
+
+
+def log_metrics(reset=True):
+    """Journalise les métriques par endpoint (nombre, octets, latence) puis les remet à zéro."""
+    for endpoint, m in sorted(metrics_snapshot(reset=reset).items()):
+        avg = m["seconds"] / m["requests"] if m["requests"] else 0.0
+        logging.info(f"📊 {endpoint} : {m['requests']} req, {m['bytes'] / 1024:.0f} Ko, "
+                     f"{avg * 1000:.0f} ms moy. / {m['max_seconds'] * 1000:.0f} ms max, "
+                     f"{m['retries']} retry, {m['errors']} erreur(s)")
+
+
+def with_metrics(func):
+    """Décorateur : journalise les métriques HTTP à la fin de chaque exécution de la fonction."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            log_metrics()
+    return wrapper
@@ -0,0 +1,296 @@
+"""Accès à l'API Notion : pagination des bases et synchronisation incrémentale."""
+import difflib, hashlib, json, logging, os, threading, time
+from datetime import datetime, timedelta, timezone
+from urllib.parse import quote, unquote
+
+from shared import http_client
+
+NOTION_API = "https://api.notion.com/v1"
+NOTION_VERSION = "2022-06-28"
+
+# ⏱️ Notion arrondit last_edited_time à la minute : une minute est "close" une fois écoulée
+WATERMARK_GRANULARITY = timedelta(minutes=1)
+
+# 🗂️ Schéma des bases (nom de propriété → id), gardé en mémoire entre deux exécutions à chaud
+SCHEMA_TTL_SECONDS = int(os.environ.get("NOTION_SCHEMA_TTL_SECONDS", "3600"))
+_schemas = {}
+_schemas_lock = threading.Lock()
+
+# ⏯️ Points de reprise des reconstructions complètes interrompues (etl-state/checkpoints/)
+CHECKPOINT_MAX_AGE_MINUTES = int(os.environ.get("NOTION_CHECKPOINT_MAX_AGE_MINUTES", "30"))
+CHECKPOINT_MAX_FAILURES = 3
+
+
+def notion_headers():
+    return {
+        "Authorization": f"Bearer {os.environ['NOTION_TOKEN']}",
+        "Notion-Version": NOTION_VERSION,
+        "Content-Type": "application/json"
+    }
+
+
+def _parse_ts(value):
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def _iso(dt):
+    return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+# 🔗 Titre d'une page liée (ex. "Nom") à partir de sa réponse JSON
+def title_from_page(data, property_name="Nom"):
+    prop = data["properties"].get(property_name)
+    if not prop:
+        logging.warning(f"❗ Propriété '{property_name}' introuvable dans la page liée.")
+        return ""
+    title_list = prop.get("title", [])
+    return title_list[0]["text"]["content"] if title_list else ""
+
+
+def database_schema(database_id, headers, max_age=SCHEMA_TTL_SECONDS, throttle=None):
+    """{nom de propriété: {"id", "type"}} de la base (GET databases/{id}), relu au-delà de max_age secondes."""
+    with _schemas_lock:
+        cached = _schemas.get(database_id)
+    if cached and time.monotonic() - cached[0] < max_age:
+        return cached[1]
+    res = http_client.get(f"{NOTION_API}/databases/{database_id}", headers=headers, throttle=throttle)
+    res.raise_for_status()
+    schema = {name: {"id": prop["id"], "type": prop["type"]} for name, prop in res.json()["properties"].items()}
+    with _schemas_lock:
+        _schemas[database_id] = (time.monotonic(), schema)
+    return schema
+
+
+def property_ids(database_id, headers, names, throttle=None):
+    """
+    Ids des propriétés `names` (pour filter_properties). Une propriété inconnue du schéma en cache
+    le fait relire (au plus une fois par minute) ; toujours absente, elle est signalée et ignorée.
+    """
+    schema = database_schema(database_id, headers, throttle=throttle)
+    if any(name not in schema for name in names):
+        schema = database_schema(database_id, headers, max_age=60, throttle=throttle)
+    missing = [name for name in names if name not in schema]
+    for name in missing:
+        close = difflib.get_close_matches(name, schema.keys(), n=1)
+        logging.warning(f"❗ Propriété '{name}' absente de la base {database_id}" + (f" (renommée en '{close[0]}' ?)" if close else ""))
+    return [schema[name]["id"] for name in names if name in schema]
+
+
+# ✂️ Projection côté Notion : seules les propriétés demandées sont renvoyées (ids déjà encodés par l'API)
+def with_properties(url, filter_properties):
+    if not filter_properties:
+        return url
+    return url + "?" + "&".join(f"filter_properties={quote(unquote(pid), safe='')}" for pid in filter_properties)
+
+
+# 📄 Parcours de toutes les pages d'une base (pagination has_more / next_cursor)
+def iter_database_pages(database_id, headers, filter=None, sorts=None, page_size=100, throttle=None,
+                        filter_properties=None, progress=None):
+    """
+    Les erreurs transitoires sont retentées par http_client ; une erreur persistante lève une exception
+    (jamais de parcours tronqué silencieusement). progress : {"cursor", "done"} d'une chaîne de curseurs,
+    repris au curseur enregistré et avancé une fois chaque réponse entièrement consommée.
+    """
+    url = with_properties(f"{NOTION_API}/databases/{database_id}/query", filter_properties)
+    payload = {"page_size": page_size}
+    if filter:
+        payload["filter"] = filter
+    if sorts:
+        payload["sorts"] = sorts
+    if progress and progress.get("cursor"):
+        payload["start_cursor"] = progress["cursor"]
+
+    while True:
+        res = http_client.post(url, headers=headers, json=payload, throttle=throttle)
+        res.raise_for_status()
+        data = res.json()
+        has_more, next_cursor = data.get("has_more"), data.get("next_cursor")
+        # ♻️ Chaque page JSON est libérée dès qu'elle est consommée : au plus une réponse (100 pages) en mémoire
+        results = data.pop("results")
+        del res, data
+        results.reverse()
+        while results:
+            yield results.pop()
+        if not has_more:
+            if progress is not None:
+                progress["done"] = True
+            break
+        payload["start_cursor"] = next_cursor
+        if progress is not None:
+            progress["cursor"] = next_cursor
+
+
+# 🧱 Projection en flux : chaque page est transformée en ligne de sortie dès sa réception
+def iter_database_rows(database_id, headers, build_row, **query):
+    for page in iter_database_pages(database_id, headers, **query):
+        yield build_row(page)
+
+
+class ScanCheckpoint:
+    """
+    Point de reprise d'une reconstruction complète, enregistré dans etl-state quand elle échoue : le
+    curseur de la prochaine réponse de chaque chaîne de curseurs (une par plage), les ids des pages déjà
+    lues (ordre de sortie) et le snapshot {page_id: ligne} en cours de construction (rows, seule copie
+    des lignes). L'exécution suivante repart de là au lieu de tout relire. Abandonné si le parcours a
+    changé (signature), s'il date de plus de CHECKPOINT_MAX_AGE_MINUTES ou s'il a déjà échoué
+    CHECKPOINT_MAX_FAILURES fois (curseur expiré).
+    """
+
+    def __init__(self, store, name, signature):
+        self.store = store
+        self.name = f"checkpoints/{name}.gz"
+        self.signature = hashlib.sha1(json.dumps(signature, sort_keys=True).encode("utf-8")).hexdigest()
+        state = store.load(self.name) or {}
+        now = datetime.now(timezone.utc)
+        self.resumed = (
+            state.get("signature") == self.signature
+            and state.get("failures", 0) < CHECKPOINT_MAX_FAILURES
+            and now - _parse_ts(state["started_at"]) < timedelta(minutes=CHECKPOINT_MAX_AGE_MINUTES)
+        )
+        if self.resumed:
+            self.chains, self.failures, self.started_at = state["chains"], state["failures"], state["started_at"]
+            self.rows, self.watermark = state["rows"], state["watermark"]
+            logging.info(f"⏯️ Reprise du parcours '{name}' : {len(self.rows)} page(s) déjà lues, tentative {self.failures + 1}.")
+        else:
+            if state:
+                logging.warning(f"⚠️ Point de reprise '{name}' abandonné (parcours modifié, trop ancien ou en échec répété).")
+            self.chains, self.failures, self.started_at = {}, 0, _iso(now)
+            self.rows, self.watermark = {}, None
+
+    def chain(self, key):
+        return self.chains.setdefault(str(key), {"cursor": None, "done": False, "ids": []})
+
+    def track(self, key, page_id):
+        self.chains[str(key)]["ids"].append(page_id)
+
+    def ordered(self):
+        """Snapshot dans l'ordre des chaînes (plages), quel que soit l'ordre d'arrivée des pages."""
+        if len(self.chains) <= 1:
+            return self.rows
+        return {page_id: self.rows[page_id]
+                for key in sorted(self.chains, key=int) for page_id in self.chains[key]["ids"]}
+
+    def save(self, watermark):
+        self.failures += 1
+        self.store.save(self.name, {"signature": self.signature, "started_at": self.started_at,
+                                    "failures": self.failures, "chains": self.chains,
+                                    "rows": self.rows, "watermark": watermark})
+        logging.warning(f"💾 Parcours interrompu : point de reprise enregistré ({len(self.rows)} page(s) lues).")
+
+    def clear(self):
+        if self.resumed or self.failures:
+            self.store.delete(self.name)
+
+
+def iter_chain(database_id, headers, chain, **query):
+    """Pages d'une chaîne de curseurs : reprise au curseur enregistré, rien si elle est déjà terminée."""
+    if not chain["done"]:
+        yield from iter_database_pages(database_id, headers, progress=chain, **query)
+
+
+# 🔎 Sonde de fraîcheur : une seule page, triée par dernière modification (titre seul : last_edited_time suffit)
+def probe_last_edited_time(database_id, headers, throttle=None):
+    url = with_properties(f"{NOTION_API}/databases/{database_id}/query", ["title"])
+    payload = {
+        "sorts": [{"timestamp": "last_edited_time", "direction": "descending"}],
+        "page_size": 1
+    }
+    res = http_client.post(url, headers=headers, json=payload, throttle=throttle)
+    res.raise_for_status()
+    results = res.json()["results"]
+    return results[0]["last_edited_time"] if results else None
+
+
+def sync_incremental(database_id, headers, store, state_name, build_row, full_refresh_minutes=60, schema_version=1,
+                     throttle=None, filter_properties=None, shards=None):
+    """
+    Maintient un snapshot {page_id: ligne} de la base dans le StateStore : renvoie (lignes à jour,
+    nouvel état), ou None si rien n'a changé depuis la dernière exécution. Le nouvel état est
+    enregistré par l'appelant (store.save(state_name, état)) une fois le CSV publié : un upload
+    en échec laisse le watermark en place et les pages sont relues au passage suivant.
+    Un changement de schema_version (colonnes produites par build_row) force une reconstruction.
+
+    Seules les pages modifiées depuis le watermark (last_edited_time) sont relues ;
+    une reconstruction complète périodique purge les pages supprimées ou archivées,
+    que l'endpoint de requête ne renvoie jamais. throttle : limiteur partagé (voir http_client.request) ;
+    filter_properties : ids des seules propriétés lues par build_row ; shards : plan de découpage
+    (shared/notion_shards.ShardPlan) de la reconstruction complète en plages parcourues en parallèle.
+    """
+    now = datetime.now(timezone.utc)
+    state = store.load(state_name) or {}
+    rows = state.get("rows")
+    watermark = state.get("watermark")
+    last_full = state.get("last_full_refresh")
+
+    full = (
+        rows is None or not watermark or not last_full
+        or state.get("schema_version", 1) != schema_version
+        or now - _parse_ts(last_full) >= timedelta(minutes=full_refresh_minutes)
+    )
+
+    if full:
+        logging.info(f"🔄 Reconstruction complète de la base {database_id}...")
+        entry = lambda page: (page["last_edited_time"], build_row(page))
+        checkpoint = ScanCheckpoint(store, state_name, [database_id, schema_version, sorted(filter_properties or []),
+                                                        shards.filters() if shards else None])
+        rows = checkpoint.rows
+        if checkpoint.resumed:
+            watermark = checkpoint.watermark
+        if shards:
+            pages = shards.scan(database_id, headers, entry, throttle=throttle, filter_properties=filter_properties,
+                                checkpoint=checkpoint)
+        else:
+            pages = ((0, page["id"], entry(page))
+                     for page in iter_chain(database_id, headers, checkpoint.chain(0), throttle=throttle,
+                                            filter_properties=filter_properties))
+        try:
+            for key, page_id, (last_edited_time, row) in pages:
+                rows[page_id] = row
+                checkpoint.track(key, page_id)
+                if not watermark or last_edited_time > watermark:
+                    watermark = last_edited_time
+        except Exception:
+            try:
+                checkpoint.save(watermark)
+            except Exception as save_error:
+                # 💾 État injoignable : l'erreur Notion d'origine reste celle remontée
+                logging.error(f"❌ Point de reprise de la base {database_id} non enregistré : {save_error}")
+            raise
+        rows = checkpoint.ordered()
+        # 🕰️ Watermark plafonné au début du parcours (initial en cas de reprise), à la minute près comme
+        # last_edited_time : une page lue tôt puis modifiée pendant le parcours sera relue au prochain delta
+        scan_started = _iso(_parse_ts(checkpoint.started_at).replace(second=0, microsecond=0))
+        if watermark and watermark > scan_started:
+            watermark = scan_started
+        checkpoint.clear()
+        return list(rows.values()), {
+            "watermark": watermark or scan_started,
+            "last_full_refresh": _iso(now),
+            "checked_at": _iso(now),
+            "schema_version": schema_version,
+            "rows": rows
+        }
+
+    latest = probe_last_edited_time(database_id, headers, throttle=throttle)
+    checked_at = state.get("checked_at")
+    minute_closed = checked_at and _parse_ts(checked_at) >= _parse_ts(watermark) + WATERMARK_GRANULARITY
+    if (latest is None or latest <= watermark) and minute_closed:
+        logging.info(f"⏭️ Aucune modification depuis {watermark} : exécution ignorée.")
+        return None
+
+    # 🧩 Fusion par page_id des pages modifiées depuis le watermark (borne incluse)
+    delta_filter = {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": watermark}}
+    updated, removed = 0, 0
+    for page in iter_database_pages(database_id, headers, filter=delta_filter, throttle=throttle,
+                                     filter_properties=filter_properties):
+        if page.get("archived") or page.get("in_trash"):
+            removed += rows.pop(page["id"], None) is not None
+            continue
+        rows[page["id"]] = build_row(page)
+        updated += 1
+        if page["last_edited_time"] > watermark:
+            watermark = page["last_edited_time"]
+    logging.info(f"🧩 {updated} page(s) fusionnée(s), {removed} retirée(s) — watermark {watermark}")
+
+    state.update({"watermark": watermark, "checked_at": _iso(now), "rows": rows})
+    return list(rows.values()), state
@@ -0,0 +1,165 @@
+"""Moteur d'extraction Notion piloté par configuration : une spécification déclarative par base.
+
+Chaque spécification décrit la base (variable d'environnement de son id), le schéma de sortie
+(colonne → propriété Notion et type), les relations résolues via les dimensions, le conteneur
+et le blob de destination. Toutes les bases sont extraites en parallèle dans la même exécution,
+sous un seul budget de débit Notion (seau à jetons partagé) et la même session HTTP.
+"""
+import json, logging, os, threading, time
+from concurrent.futures import ThreadPoolExecutor
+
+from shared.blob_sink import BlobSink
+from shared.csv_export import write_csv
+from shared.notion import iter_database_rows, property_ids, sync_incremental
+from shared.notion_resolver import NOTION_RATE_PER_SECOND, RelationResolver, TokenBucket
+from shared.notion_schema import RowPlan
+from shared.notion_shards import ShardPlan
+from shared.parquet_export import parquet_rows
+from shared.relation_cache import RelationCache
+from shared.star_join import load_dimension_index, resolve_foreign_keys
+
+MAX_PARALLEL_DATABASES = int(os.environ.get("NOTION_MAX_PARALLEL_DATABASES", "4"))
+RATE_PER_SECOND = float(os.environ.get("NOTION_RATE_PER_SECOND", str(NOTION_RATE_PER_SECOND)))
+RELATION_CACHE_SNAPSHOT = "relation_cache/notion.json"
+
+# 🗃️ Cache des relations partagé par toutes les bases (conservé entre deux exécutions « à chaud »)
+relation_cache = RelationCache(ttl_seconds=int(os.environ.get("RELATION_CACHE_TTL_SECONDS", "21600")))
+
+# ⏲️ Dernière extraction de chaque base (intervalle minimal entre deux extractions)
+_last_run = {}
+_last_run_lock = threading.Lock()
+
+
+class DatabaseSpec:
+    """
+    Spécification d'une base : {name, database_id_env, container, blob, columns, encoding,
+    incremental: {state, schema_version}, interval_seconds, shards: {timestamp | property, count}}. Chaque colonne déclare
+    "property" et "type" (ou "type": "page_id" / "relation_title"), "parquet" et "default".
+    """
+
+    def __init__(self, name, database_id_env, container, blob, columns, encoding="utf-8",
+                 incremental=None, interval_seconds=0, shards=None):
+        self.name = name
+        self.database_id_env = database_id_env
+        self.container = container
+        self.blob = blob
+        self.parquet_blob = os.path.splitext(blob)[0] + ".parquet"
+        self.columns = columns
+        self.column_names = list(columns)
+        self.parquet_types = {name: column.get("parquet", "string") for name, column in columns.items()}
+        self.encoding = encoding
+        self.incremental = incremental
+        self.interval_seconds = interval_seconds
+        self.shards = shards
+        self.relations = {name: column for name, column in columns.items() if column["type"] == "relation_title"}
+        self.plan = RowPlan(columns, name)  # 🧮 construit une fois, réutilisé à chaque exécution
+
+    @property
+    def database_id(self):
+        return os.environ[self.database_id_env]
+
+
+def load_specs(path):
+    with open(path, encoding="utf-8") as f:
+        return [DatabaseSpec(**entry) for entry in json.load(f)["databases"]]
+
+
+def _due(spec):
+    with _last_run_lock:
+        last = _last_run.get(spec.name)
+        if last is not None and time.monotonic() - last < spec.interval_seconds:
+            return False
+        _last_run[spec.name] = time.monotonic()
+        return True
+
+
+def extract_database(spec, connection_string, headers, store, bucket, resolver):
+    """
+    Extrait une base et publie son CSV (+ Parquet) ; renvoie le nombre de lignes, ou None si inchangée.
+    resolver : RelationResolver commun à toutes les bases de l'exécution (une seule requête par page liée).
+    """
+    build_row = spec.plan.new_run()
+    # ✂️ Projection : seules les propriétés lues par le plan transitent (ids résolus via le schéma en cache)
+    shards = ShardPlan(spec.name, spec.shards, store) if spec.shards else None
+    try:
+        names = list(spec.plan.properties)
+        if shards and shards.property and shards.property not in spec.plan.properties:
+            names.append(shards.property)  # 🧩 clé de découpage lue sur chaque page
+        projection = property_ids(spec.database_id, headers, names, throttle=bucket)
+    except Exception as e:
+        logging.warning(f"⚠️ Schéma de '{spec.name}' illisible, pages complètes demandées : {e}")
+        projection = None
+    new_state = None
+    if spec.incremental:
+        # 🧩 Snapshot + watermark dans etl-state : seules les pages modifiées sont relues
+        synced = sync_incremental(
+            spec.database_id, headers, store, spec.incremental["state"], build_row,
+            full_refresh_minutes=int(os.environ.get("NOTION_FULL_REFRESH_MINUTES", "60")),
+            schema_version=spec.incremental.get("schema_version", 1), throttle=bucket,
+            filter_properties=projection, shards=shards
+        )
+        if synced is None:
+            return None
+        lignes, new_state = synced
+    elif shards:
+        # 📚 Pages reçues dans le désordre des plages : regroupées par plage pour un CSV stable d'une exécution à l'autre
+        by_shard = [[] for _ in shards.filters()]
+        for index, _, row in shards.scan(spec.database_id, headers, build_row, throttle=bucket,
+                                         filter_properties=projection):
+            by_shard[index].append(row)
+        lignes = (row for rows in by_shard for row in rows)
+    else:
+        lignes = iter_database_rows(spec.database_id, headers, build_row, throttle=bucket,
+                                    filter_properties=projection)
+
+    if spec.relations:
+        # ⭐ Jointure locale avec les dimensions, clés absentes résolues en direct sous le même budget
+        lignes = list(lignes)
+        for name, column in spec.relations.items():
+            container, blob_name = column["dimension"]
+            index = load_dimension_index(connection_string, container, blob_name)
+            resolve_foreign_keys(lignes, column["key"], name, index, resolve_missing=resolver.resolve_many)
+
+    # 🔀 Sorties fermées dans l'ordre inverse : le CSV (source de vérité) est validé avant le Parquet,
+    # jamais de Parquet plus récent que le CSV ; un échec du CSV n'en valide aucun
+    with parquet_rows(connection_string, spec.container, spec.parquet_blob, spec.parquet_types) as parquet, \
+            BlobSink(connection_string, spec.container, spec.blob, encoding=spec.encoding) as out:
+        out.rows = write_csv(out, parquet.tee(lignes), spec.column_names)
+    if new_state is not None:
+        # 💾 État enregistré après un upload réussi : un échec sera repris au prochain passage
+        store.save(spec.incremental["state"], new_state)
+    logging.info(f"📦 '{spec.blob}' ({out.rows} lignes) {'mis à jour' if out.changed else 'inchangé'} dans le conteneur '{spec.container}'.")
+    return out.rows
+
+
+def run_all(specs, connection_string, headers, store, max_workers=MAX_PARALLEL_DATABASES):
+    """Extrait en parallèle les bases dues ; une base en échec n'interrompt pas les autres."""
+    due = [spec for spec in specs if _due(spec)]
+    if not due:
+        return {}
+    if not relation_cache.loaded:
+        relation_cache.load(store, RELATION_CACHE_SNAPSHOT)
+    relation_cache.reset_stats()
+    bucket = TokenBucket(rate=RATE_PER_SECOND)
+    # 🧷 Un seul résolveur : une page liée demandée par plusieurs bases en parallèle n'est lue qu'une fois
+    resolver = RelationResolver(headers, cache=relation_cache, property_name="Nom", bucket=bucket)
+
+    def run(spec):
+        started = time.monotonic()
+        try:
+            rows = extract_database(spec, connection_string, headers, store, bucket, resolver)
+            return spec.name, {"rows": rows, "seconds": round(time.monotonic() - started, 1)}
+        except Exception as e:
+            logging.error(f"❌ Extraction '{spec.name}' en échec : {e}")
+            with _last_run_lock:
+                _last_run.pop(spec.name, None)  # 🔁 réessayée au prochain tick
+            return spec.name, {"error": str(e)}
+
+    logging.info(f"🚀 Extraction Notion de {len(due)} base(s) : {', '.join(spec.name for spec in due)}")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        summary = dict(executor.map(run, due))
+    if any(result.get("rows") is not None for result in summary.values()):
+        relation_cache.save(store, RELATION_CACHE_SNAPSHOT)
+        logging.info(f"🗃️ Cache de relations : {relation_cache.stats()}")
+    logging.info(f"📋 Bilan extraction Notion : {summary}")
+    return summary
@@ -0,0 +1,108 @@
+"""Résolution concurrente et limitée en débit des titres de pages liées Notion."""
+import logging, threading, time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from shared import http_client
+from shared.notion import NOTION_API, title_from_page, with_properties
+
+# 🚦 Notion autorise en moyenne ~3 requêtes/s par intégration
+NOTION_RATE_PER_SECOND = 3.0
+
+
+class TokenBucket:
+    def __init__(self, rate=NOTION_RATE_PER_SECOND, capacity=3):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._not_before = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now >= self._not_before:
+                    self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+                else:
+                    wait = self._not_before - now
+            time.sleep(wait)
+
+    # ⏸️ Retry-After : suspend toutes les requêtes partageant ce seau
+    def pause(self, seconds):
+        with self._lock:
+            self._not_before = max(self._not_before, time.monotonic() + seconds)
+            self._tokens = 0.0
+            self._updated = self._not_before
+
+
+class RelationResolver:
+    def __init__(self, headers, cache=None, property_name="Nom", max_workers=8, bucket=None, max_retries=5):
+        self.headers = headers
+        self.cache = cache
+        self.property_name = property_name
+        self.max_workers = max_workers
+        self.bucket = bucket or TokenBucket()
+        self.max_retries = max_retries
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def resolve_many(self, page_ids):
+        """Renvoie {page_id: titre} pour les ids distincts donnés ("" si la page est illisible)."""
+        results, pending = {}, set()
+        for page_id in set(page_ids):
+            cached = self.cache.get(page_id, self.property_name) if self.cache else None
+            if cached is not None:
+                results[page_id] = cached
+            else:
+                pending.add(page_id)
+        if not pending:
+            return results
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {page_id: self._submit(executor, page_id) for page_id in pending}
+            for page_id, future in futures.items():
+                title = future.result()
+                results[page_id] = title or ""
+        logging.info(f"⚡ {len(pending)} relation(s) résolue(s) en {time.monotonic() - started:.1f}s")
+        return results
+
+    # 🧷 Coalescence : une seule requête en vol par page_id
+    def _submit(self, executor, page_id):
+        with self._lock:
+            future = self._inflight.get(page_id)
+            if future is None:
+                future = Future()
+                self._inflight[page_id] = future
+                executor.submit(self._run, page_id, future)
+            return future
+
+    def _run(self, page_id, future):
+        try:
+            title = self._fetch(page_id)
+            if title is not None and self.cache:
+                self.cache.put(page_id, self.property_name, title)
+            future.set_result(title)
+        except Exception as e:
+            logging.error(f"❌ Erreur lecture page liée '{page_id}' : {e}")
+            future.set_result(None)
+        finally:
+            with self._lock:
+                self._inflight.pop(page_id, None)
+
+    def _fetch(self, page_id):
+        # 🔁 Retries (Retry-After / backoff) via le client commun, en suspendant tout le seau à jetons
+        # ✂️ Seul le titre est demandé (id de propriété "title" dans toutes les bases)
+        res = http_client.get(with_properties(f"{NOTION_API}/pages/{page_id}", ["title"]), headers=self.headers,
+                              retries=self.max_retries, throttle=self.bucket)
+        if res.status_code != 200:
+            logging.warning(f"⚠️ Impossible de récupérer la page liée : {page_id} | Status: {res.status_code}")
+            return None
+        return title_from_page(res.json(), self.property_name)
+
@@ -0,0 +1,221 @@
+"""Plans d'extraction : correspondance colonnes → propriétés Notion, construite une fois par base.
+
+La spécification des colonnes est traduite en une liste d'accesseurs (une fonction par colonne,
+spécialisée selon le type de la propriété : nom de la propriété, partie de date, format et valeur
+par défaut fixés à la construction du plan), sans KeyError. La projection d'une page ne fait plus
+d'aiguillage par type ni de relecture de la spécification. Les propriétés absentes ou de type
+inattendu sont signalées une fois par exécution (première page), puis remplacées par la valeur
+par défaut de la colonne.
+"""
+import difflib, logging, threading
+from datetime import datetime
+
+_E = {}  # dict vide partagé (jamais modifié)
+
+
+def _format_date(value, fmt):
+    try:
+        return datetime.fromisoformat(value).strftime(fmt)
+    except ValueError:
+        return f"{value} 00:00:00"
+
+
+# 🔤 Accesseurs par type Notion : accesseur(p = propriétés de la page, page) → valeur de la cellule.
+# Chemin rapide par indexation directe (propriété présente et du type attendu, cas courant) ;
+# une KeyError (propriété absente, renommée, d'un autre type) mène à la valeur par défaut.
+def _text(kind, name, default):
+    def get(p, page):
+        try:
+            fragments = p[name][kind]
+            return fragments[0]["text"]["content"] if fragments else ""
+        except KeyError:
+            prop = p.get(name)
+            if not prop:
+                return default
+            fragments = prop.get(kind)
+            return fragments[0].get("text", _E).get("content", "") if fragments else ""
+    return get
+
+
+def _option(kind, name, default):
+    def get(p, page):
+        try:
+            option = p[name][kind]
+            return option["name"] if option else default
+        except KeyError:
+            return default
+    return get
+
+
+def _multi_select(kind, name, default):
+    def get(p, page):
+        try:
+            items = p[name]["multi_select"]
+        except KeyError:
+            return "" if p.get(name) else default
+        return ", ".join([item["name"] for item in items]) if items else ""
+    return get
+
+
+def _scalar(kind, name, default):
+    def get(p, page):
+        try:
+            value = p[name][kind]
+        except KeyError:
+            return default
+        return default if value is None else value
+    return get
+
+
+def _formula(kind, name, default):
+    def get(p, page):
+        try:
+            formula = p[name]["formula"]
+            value = formula[formula["type"]] if formula else None
+        except KeyError:
+            return default
+        return default if value is None else value
+    return get
+
+
+def _first_of_list(key):
+    def accessor(kind, name, default):
+        def get(p, page):
+            try:
+                items = p[name][kind]
+                value = items[0][key] if items else None
+            except KeyError:
+                return default
+            return default if value is None else value
+        return get
+    return accessor
+
+
+def _unique_id(kind, name, default):
+    def get(p, page):
+        prop = p.get(name)
+        if not prop:
+            return default
+        unique_id = prop.get("unique_id") or _E
+        return (unique_id.get("prefix") or "") + str(unique_id.get("number", ""))
+    return get
+
+
+def _date(name, default, part, fmt):
+    def get(p, page):
+        try:
+            date = p[name]["date"]
+            value = date[part] if date else None
+        except KeyError:
+            return default
+        return value if value else default
+
+    def get_formatted(p, page):
+        try:
+            date = p[name]["date"]
+            value = date[part] if date else None
+        except KeyError:
+            return default
+        return _format_date(value, fmt) if value else default
+    return get_formatted if fmt else get
+
+
+ACCESSORS = {
+    "title": _text,
+    "rich_text": _text,
+    "select": _option,
+    "status": _option,
+    "multi_select": _multi_select,
+    "number": _scalar,
+    "checkbox": _scalar,
+    "formula": _formula,
+    "people": _first_of_list("name"),
+    "unique_id": _unique_id,
+    "relation": _first_of_list("id"),
+}
+
+
+def _page_id(p, page):
+    return page["id"]
+
+
+def _relation_title(p, page):
+    return ""  # 🔗 renseignée ensuite par la jointure avec la dimension
+
+
+def column_accessors(columns):
+    """[(colonne, accesseur(p, page))] dans l'ordre des colonnes."""
+    accessors = []
+    for column_name, column in columns.items():
+        kind = column["type"]
+        if kind == "page_id":
+            get = _page_id
+        elif kind == "relation_title":
+            get = _relation_title
+        elif kind == "date":
+            get = _date(column["property"], column.get("default", ""), column.get("part", "start"), column.get("format"))
+        elif kind in ACCESSORS:
+            get = ACCESSORS[kind](kind, column["property"], column.get("default", ""))
+        else:
+            raise ValueError(f"Type de colonne inconnu pour '{column_name}' : {kind}")
+        accessors.append((column_name, get))
+    return accessors
+
+
+def row_builder(accessors, on_first=None):
+    """
+    build_row(page) → {colonne: valeur} : une boucle sur les accesseurs, sans appel intermédiaire.
+    on_first(page) est appelé une seule fois, sur la première page (appels concurrents compris).
+    """
+    pairs = tuple(accessors)
+    pending = [on_first] if on_first else []
+    lock = threading.Lock()
+
+    def build_row(page):
+        if pending:
+            with lock:
+                if pending:
+                    pending[0](page)
+                    pending.clear()
+        p = page["properties"]
+        row = {}
+        for column_name, get in pairs:
+            row[column_name] = get(p, page)
+        return row
+    return build_row
+
+
+class RowPlan:
+    """
+    Plan d'une base, construit une fois et partagé (sans état) : plan.build_row(page) → ligne
+    {colonne: valeur} dans l'ordre des colonnes. Colonnes spéciales : "page_id" (id de la page)
+    et "relation_title" ("" renseigné par la jointure). new_run() → projection d'une exécution.
+    """
+
+    def __init__(self, columns, name=""):
+        self.name = name
+        self.properties = {}
+        for column in columns.values():
+            if "property" in column:
+                self.properties.setdefault(column["property"], column["type"])
+        self.accessors = column_accessors(columns)
+        self.build_row = row_builder(self.accessors)
+
+    # ▶️ Projection d'une exécution : même boucle, schéma contrôlé sur sa première page (plages parallèles comprises)
+    def new_run(self):
+        return row_builder(self.accessors, on_first=self.check)
+
+    def check(self, page):
+        """Propriétés absentes, renommées (nom proche) ou de type inattendu : un avertissement pour la base."""
+        props = page.get("properties", {})
+        problems = []
+        for name, kind in self.properties.items():
+            prop = props.get(name)
+            if prop is None:
+                close = difflib.get_close_matches(name, props.keys(), n=1)
+                problems.append(f"'{name}' absente" + (f" (renommée en '{close[0]}' ?)" if close else ""))
+            elif prop.get("type", kind) != kind:
+                problems.append(f"'{name}' de type '{prop['type']}' (attendu '{kind}')")
+        if problems:
+            logging.warning(f"❗ Schéma Notion '{self.name}' : {', '.join(problems)} — valeur par défaut appliquée.")
+        return problems
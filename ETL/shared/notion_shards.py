@@ -0,0 +1,149 @@
+"""Scans Notion partitionnés : une requête de base découpée en plages disjointes parcourues en parallèle.
+
+Une requête Notion est une chaîne de curseurs strictement séquentielle : sur une grande base, une
+reconstruction complète enchaîne des dizaines d'allers-retours. Le plan découpe la base en plages
+disjointes d'une clé ordonnée (created_time ou propriété date), parcourues simultanément sous le même
+seau à jetons : la durée suit le débit autorisé et non plus la latence cumulée. Les bornes sont
+recalculées après chaque scan complet (quantiles des valeurs vues) et conservées dans etl-state,
+pour que chaque plage porte à peu près le même nombre de pages au passage suivant.
+"""
+import logging, os, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from queue import Empty, Full, Queue
+
+from shared.notion import iter_chain
+
+SHARD_STATE = "shards/{name}.json"
+MAX_SHARD_WORKERS = int(os.environ.get("NOTION_SHARD_WORKERS", "4"))
+SCAN_QUEUE_SIZE = 500  # 📥 pages en attente entre les plages et le consommateur (mémoire bornée)
+
+
+class ShardPlan:
+    """
+    Plan de découpage d'une base : {"timestamp": "created_time"} ou {"property": "<date>"}, "count" plages.
+    Sans bornes connues (premier passage, clé modifiée), le scan est séquentiel et fournit les bornes suivantes.
+    """
+
+    def __init__(self, name, config, store):
+        self.name = name
+        self.timestamp = config.get("timestamp")
+        self.property = config.get("property")
+        self.count = int(config.get("count", 4))
+        self.key = self.timestamp or self.property
+        self.store = store
+        self.state_name = SHARD_STATE.format(name=name)
+        state = store.load(self.state_name) or {}
+        self.boundaries = state.get("boundaries", []) if state.get("key") == self.key else []
+        self.previous_counts = state.get("counts")
+
+    def _condition(self, operator, value):
+        if self.timestamp:
+            return {"timestamp": self.timestamp, self.timestamp: {operator: value}}
+        return {"property": self.property, "date": {operator: value}}
+
+    def filters(self):
+        """Filtres des plages (bornes b : [.., b0[, [b0, b1[, …, [bn, ..]) ; pages sans date dans la première."""
+        if not self.boundaries:
+            return [None]
+        first = self._condition("before", self.boundaries[0])
+        if self.property:
+            first = {"or": [first, {"property": self.property, "date": {"is_empty": True}}]}
+        middle = [{"and": [self._condition("on_or_after", low), self._condition("before", high)]}
+                  for low, high in zip(self.boundaries, self.boundaries[1:])]
+        return [first, *middle, self._condition("on_or_after", self.boundaries[-1])]
+
+    def value(self, page):
+        if self.timestamp:
+            return page.get(self.timestamp)
+        date = ((page["properties"].get(self.property) or {}).get("date") or {}).get("start")
+        return date[:10] if date else None
+
+    def rebalance(self, values, counts):
+        """Nouvelles bornes : quantiles des valeurs du scan (count plages de tailles égales)."""
+        values = sorted(v for v in values if v)
+        cuts = sorted({values[len(values) * k // self.count] for k in range(1, self.count)}) if values else []
+        self.boundaries = [cut for cut in cuts if cut > values[0]] if values else []
+        self.store.save(self.state_name, {"key": self.key, "boundaries": self.boundaries, "counts": counts})
+
+    def scan(self, database_id, headers, transform, throttle=None, filter_properties=None, checkpoint=None,
+             max_workers=MAX_SHARD_WORKERS):
+        """
+        Génère (plage, page_id, transform(page)) au fil de l'arrivée des pages, plages parcourues en parallèle
+        à travers une file bornée (aucune plage n'est matérialisée), sans doublon de page_id. Chaque plage est
+        une chaîne de curseurs du point de reprise (checkpoint) : une plage terminée n'est pas relue, une plage
+        interrompue reprend à son curseur. Sur erreur d'une plage, les autres sont arrêtées et les pages déjà
+        en file restituées avant l'exception : tout curseur avancé correspond à des pages consommées.
+        Bornes recalculées à la fin d'un scan complet (pas après une reprise : valeurs partielles).
+        """
+        filters = self.filters()
+        chains = [checkpoint.chain(index) if checkpoint else {"cursor": None, "done": False}
+                  for index in range(len(filters))]
+        queue = Queue(maxsize=SCAN_QUEUE_SIZE)
+        stop = threading.Event()
+        started = time.monotonic()
+
+        def put(entry):
+            while not stop.is_set():
+                try:
+                    queue.put(entry, timeout=0.1)
+                    return True
+                except Full:
+                    pass
+            return False
+
+        def run(index):
+            try:
+                for page in iter_chain(database_id, headers, chains[index], filter=filters[index], throttle=throttle,
+                                       filter_properties=filter_properties):
+                    if not put((index, page["id"], self.value(page), transform(page))):
+                        return
+            except Exception as e:
+                put((index, None, None, e))
+            else:
+                put((index, None, None, None))  # 🏁 plage terminée
+
+        seen, values, counts = set(), [], [0] * len(filters)
+
+        def accept(index, page_id, value):
+            counts[index] += 1
+            values.append(value)
+            if page_id in seen:
+                return False
+            seen.add(page_id)
+            return True
+
+        executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(filters))))
+        try:
+            for index in range(len(filters)):
+                executor.submit(run, index)
+            running, error = len(filters), None
+            while running:
+                index, page_id, value, item = queue.get()
+                if page_id is None:
+                    running -= 1
+                    if item is not None:
+                        error = item
+                        break
+                elif accept(index, page_id, value):
+                    yield index, page_id, item
+            if error is not None:
+                # 🧯 Plages arrêtées, pages déjà en file restituées : le point de reprise reste cohérent
+                stop.set()
+                executor.shutdown(wait=True)
+                while True:
+                    try:
+                        index, page_id, value, item = queue.get_nowait()
+                    except Empty:
+                        break
+                    if page_id is not None and accept(index, page_id, value):
+                        yield index, page_id, item
+                raise error
+        finally:
+            stop.set()
+            executor.shutdown(wait=True, cancel_futures=True)
+        logging.info(f"🧩 Scan de '{self.name}' en {len(filters)} plage(s) {counts} : {len(seen)} page(s) "
+                     f"en {time.monotonic() - started:.1f}s (scan précédent : {self.previous_counts})")
+        if checkpoint and checkpoint.resumed:
+            logging.info(f"🧩 Scan repris : bornes de '{self.name}' conservées.")
+        else:
+            self.rebalance(values, counts)
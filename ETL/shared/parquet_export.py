@@ -0,0 +1,142 @@
+"""Export Parquet optionnel (à côté du CSV) : types explicites, colonnes catégorielles encodées en dictionnaire.
+
+Activé par EXPORT_PARQUET=1, nécessite pyarrow (dépendance optionnelle : sans elle, seul le CSV est produit).
+pyarrow n'est importé qu'au premier export activé (démarrage à froid plus rapide).
+Les schémas sont déclarés par nom de type pour rester indépendants de pyarrow :
+"string", "category", "int", "float", "bool", "date", "timestamp" (heure locale naïve), "timestamptz" (instant UTC).
+"""
+import contextlib, logging, os
+from datetime import date, datetime
+
+from shared.blob_sink import BlobSink
+
+pa = pq = None  # 📦 chargés par enabled() ; restent None si pyarrow est absent
+
+PARQUET_ENABLED = os.environ.get("EXPORT_PARQUET") == "1"
+COMPRESSION = os.environ.get("PARQUET_COMPRESSION", "zstd")  # "zstd" ou "snappy"
+ROW_GROUP_SIZE = int(os.environ.get("PARQUET_ROW_GROUP_SIZE", "50000"))
+CONTENT_TYPE = "application/vnd.apache.parquet"
+
+_warned = False
+
+
+def enabled():
+    global _warned, pa, pq
+    if PARQUET_ENABLED and pa is None and not _warned:
+        try:
+            import pyarrow, pyarrow.parquet
+            pa, pq = pyarrow, pyarrow.parquet
+        except ImportError:  # 📦 pyarrow absent : export Parquet désactivé
+            logging.warning("⚠️ EXPORT_PARQUET=1 mais pyarrow n'est pas installé : export Parquet ignoré.")
+            _warned = True
+    return PARQUET_ENABLED and pa is not None
+
+
+def arrow_schema(types):
+    mapping = {
+        "string": pa.string(),
+        "category": pa.dictionary(pa.int32(), pa.string()),
+        "int": pa.int64(),
+        "float": pa.float64(),
+        "bool": pa.bool_(),
+        "date": pa.date32(),
+        "timestamp": pa.timestamp("ms"),
+        "timestamptz": pa.timestamp("ms", tz="UTC"),
+    }
+    return pa.schema([(name, mapping[kind]) for name, kind in types.items()])
+
+
+# 🔤 Valeurs Python (Notion) → valeurs typées ; "" devient null hors colonnes texte
+def _convert(value, kind):
+    if value is None:
+        return None
+    if kind in ("string", "category"):
+        return str(value)
+    if value == "":
+        return None
+    if kind == "date":
+        return date.fromisoformat(str(value)[:10])
+    if kind in ("timestamp", "timestamptz"):
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    return value
+
+
+def _column(values, kind, field):
+    if kind == "category":
+        return pa.array(values, pa.string()).dictionary_encode().cast(field.type)
+    return pa.array(values, field.type)
+
+
+class ParquetRows:
+    """Écrit des lignes (dict) en Parquet par groupes de ROW_GROUP_SIZE lignes : mémoire bornée."""
+
+    def __init__(self, sink, types, compression=COMPRESSION, row_group_size=ROW_GROUP_SIZE):
+        self.types = types
+        self.schema = arrow_schema(types)
+        self.row_group_size = row_group_size
+        self.rows = 0
+        self._columns = {name: [] for name in types}
+        self._writer = pq.ParquetWriter(sink, self.schema, compression=compression)
+
+    def append(self, row):
+        for name, kind in self.types.items():
+            self._columns[name].append(_convert(row.get(name), kind))
+        self.rows += 1
+        if len(self._columns[next(iter(self.types))]) >= self.row_group_size:
+            self._flush()
+
+    # 🔁 Laisse passer les lignes (vers le CSV) en les écrivant au passage en Parquet
+    def tee(self, rows):
+        for row in rows:
+            self.append(row)
+            yield row
+
+    def _flush(self):
+        arrays = [_column(self._columns[f.name], self.types[f.name], f) for f in self.schema]
+        self._writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+        self._columns = {name: [] for name in self.types}
+
+    def close(self):
+        if self.rows == 0 or self._columns[next(iter(self.types))]:
+            self._flush()
+        self._writer.close()
+
+
+class _NoParquet:
+    def tee(self, rows):
+        return rows
+
+
+@contextlib.contextmanager
+def parquet_rows(connection_string, container, blob_name, types):
+    """
+    Sortie Parquet d'un extrait en lignes, publiée dans le même conteneur que le CSV.
+    Sans EXPORT_PARQUET / pyarrow, tee() renvoie les lignes telles quelles.
+    """
+    if not enabled():
+        yield _NoParquet()
+        return
+    with BlobSink(connection_string, container, blob_name, encoding=None, content_type=CONTENT_TYPE) as out:
+        writer = ParquetRows(out, types)
+        yield writer
+        writer.close()
+        out.rows = writer.rows
+
+
+# 🐼 DataFrame → Parquet typé (colonnes absentes du schéma conservées avec le type inféré)
+def write_frame(connection_string, container, blob_name, df, types, compression=COMPRESSION):
+    if not enabled():
+        return
+    table = pa.Table.from_pandas(df, preserve_index=False).replace_schema_metadata(None)
+    for name, kind in types.items():
+        i = table.schema.get_field_index(name)
+        target = arrow_schema({name: kind}).field(0)
+        column = table.column(i)
+        if kind == "category":
+            column = column.cast(pa.string()).dictionary_encode().cast(target.type)
+        else:
+            column = column.cast(target.type)
+        table = table.set_column(i, target, column)
+    with BlobSink(connection_string, container, blob_name, encoding=None, content_type=CONTENT_TYPE) as out:
+        out.rows = table.num_rows
+        pq.write_table(table, out, compression=compression, row_group_size=ROW_GROUP_SIZE)
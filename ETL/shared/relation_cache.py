@@ -0,0 +1,72 @@
+"""Cache TTL/LRU des titres de pages liées Notion, persisté entre les exécutions."""
+import logging, threading, time
+from collections import OrderedDict
+
+
+class RelationCache:
+    def __init__(self, ttl_seconds=6 * 3600, max_entries=5000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.loaded = False
+        self._entries = OrderedDict()  # (page_id, property_name) → (valeur, expiration)
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def get(self, page_id, property_name):
+        key = (page_id, property_name)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.time():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, page_id, property_name, value):
+        with self._lock:
+            self._entries[(page_id, property_name)] = (value, time.time() + self.ttl_seconds)
+            self._entries.move_to_end((page_id, property_name))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._dirty = True
+
+    def get_or_fetch(self, page_id, property_name, fetch):
+        value = self.get(page_id, property_name)
+        if value is None:
+            value = fetch()
+            # ❗ Les échecs de lecture (None) ne sont pas mis en cache
+            if value is not None:
+                self.put(page_id, property_name, value)
+        return value
+
+    def reset_stats(self):
+        self.hits, self.misses = 0, 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        ratio = self.hits / total if total else 0.0
+        return {"hits": self.hits, "misses": self.misses, "hit_ratio": round(ratio, 3), "size": len(self._entries)}
+
+    # 💾 Snapshot JSON (via StateStore) pour survivre aux démarrages à froid
+    def load(self, store, name):
+        now = time.time()
+        snapshot = store.load(name) or []
+        with self._lock:
+            for page_id, property_name, value, expires_at in snapshot:
+                if expires_at > now:
+                    self._entries[(page_id, property_name)] = (value, expires_at)
+            self.loaded = True
+        logging.info(f"🗃️ Cache de relations chargé : {len(self._entries)} entrée(s)")
+
+    def save(self, store, name):
+        with self._lock:
+            if not self._dirty:
+                return
+            snapshot = [[k[0], k[1], v[0], v[1]] for k, v in self._entries.items()]
+            self._dirty = False
+        store.save(name, snapshot)
@@ -0,0 +1,165 @@
+"""Garde d'exécution distribuée : un seul run par fonction, toutes instances confondues (bail sur un blob).
+
+Un tick qui tombe pendant une exécution en cours est ignoré ; en mode "coalesce" (défaut),
+il est noté dans un marqueur et tous les ticks ignorés donnent lieu à UNE relance à la fin
+de l'exécution en cours. Le marqueur est lu puis réécrit sous condition d'ETag (aucun tick perdu entre
+deux instances). Le bail est renouvelé en tâche de fond pendant les longues exécutions ; s'il est
+perdu, l'exécution en cours n'est plus exclusive : la relance coalescée est alors abandonnée.
+"""
+import functools, json, logging, os, threading
+from datetime import datetime, timezone
+from azure.core import MatchConditions
+from azure.core.exceptions import HttpResponseError, ResourceExistsError, ResourceModifiedError, ResourceNotFoundError
+
+LEASE_SECONDS = 60
+OVERLAP_POLICY = os.environ.get("RUN_OVERLAP_POLICY", "coalesce")  # "coalesce" ou "skip"
+LOCK_PREFIX = "locks/"
+PENDING_MAX_ATTEMPTS = 10
+
+_metrics = {}
+_metrics_lock = threading.Lock()
+
+
+def _count(name, key, n=1):
+    with _metrics_lock:
+        counters = _metrics.setdefault(name, {"runs": 0, "skipped": 0, "coalesced": 0, "lease_lost": 0})
+        counters[key] += n
+
+
+def metrics_snapshot():
+    with _metrics_lock:
+        return {k: dict(v) for k, v in _metrics.items()}
+
+
+class RunGuard:
+    def __init__(self, name, connection_string):
+        # 🐢 azure-storage-blob importé au premier tick, pas à l'indexation des fonctions
+        from shared.state import StateStore
+
+        self.name = name
+        self.container = StateStore(connection_string).container
+        self.lock_blob = self.container.get_blob_client(f"{LOCK_PREFIX}{name}.lock")
+        self.pending_blob = self.container.get_blob_client(f"{LOCK_PREFIX}{name}.pending")
+        self.lease = None
+        self.lease_lost = False
+        self._stop = threading.Event()
+        self._renewer = None
+
+    def _ensure_lock_blob(self):
+        try:
+            self.lock_blob.upload_blob(b"", overwrite=False)
+        except ResourceExistsError:
+            pass
+        except ResourceNotFoundError:
+            # 🆕 Premier passage : le conteneur d'état n'existe pas encore
+            try:
+                self.container.create_container()
+            except ResourceExistsError:
+                pass
+            self._ensure_lock_blob()
+
+    def acquire(self):
+        self._ensure_lock_blob()
+        try:
+            self.lease = self.lock_blob.acquire_lease(lease_duration=LEASE_SECONDS)
+        except HttpResponseError as e:
+            if e.status_code == 409:  # bail détenu par une autre exécution
+                return False
+            raise
+        self._renewer = threading.Thread(target=self._renew_loop, daemon=True)
+        self._renewer.start()
+        return True
+
+    def _renew_loop(self):
+        while not self._stop.wait(LEASE_SECONDS / 3):
+            try:
+                self.lease.renew()
+            except HttpResponseError as e:
+                self.lease_lost = True
+                _count(self.name, "lease_lost")
+                logging.warning(f"⚠️ Bail '{self.name}' non renouvelé : exécution plus exclusive ({e})")
+                return
+
+    def release(self):
+        self._stop.set()
+        if self._renewer:
+            self._renewer.join()
+        try:
+            self.lease.release()
+        except HttpResponseError as e:
+            logging.warning(f"⚠️ Bail '{self.name}' non libéré (expirera seul) : {e}")
+
+    # 📌 Tick ignoré : noté dans le marqueur (nombre de ticks depuis la dernière exécution).
+    # Écriture conditionnée à l'ETag lu (ou à l'absence du blob) : sur conflit, relecture et nouvel essai
+    def mark_pending(self):
+        for _ in range(PENDING_MAX_ATTEMPTS):
+            try:
+                download = self.pending_blob.download_blob()
+                condition = {"etag": download.properties.etag, "match_condition": MatchConditions.IfNotModified}
+                pending = json.loads(download.readall())
+            except ResourceNotFoundError:
+                download, condition, pending = None, {}, None
+            except ValueError:
+                pending = None
+            if pending is None:
+                pending = {"ticks": 0, "since": datetime.now(timezone.utc).isoformat(timespec="seconds")}
+            pending["ticks"] += 1
+            try:
+                self.pending_blob.upload_blob(json.dumps(pending), overwrite=download is not None, **condition)
+                return
+            except (ResourceModifiedError, ResourceExistsError):
+                continue
+        logging.warning(f"⚠️ Marqueur '{self.name}' en conflit après {PENDING_MAX_ATTEMPTS} tentatives : tick non noté.")
+
+    # 🔁 Ticks ignorés pendant l'exécution : consommés (marqueur supprimé s'il n'a pas changé depuis sa lecture)
+    def take_pending(self):
+        for _ in range(PENDING_MAX_ATTEMPTS):
+            try:
+                download = self.pending_blob.download_blob()
+                etag = download.properties.etag
+                try:
+                    pending = json.loads(download.readall())
+                except ValueError:
+                    pending = {"ticks": 1}
+                self.pending_blob.delete_blob(etag=etag, match_condition=MatchConditions.IfNotModified)
+            except ResourceNotFoundError:
+                return 0
+            except ResourceModifiedError:
+                continue  # ✍️ tick noté entre la lecture et la suppression : relu
+            return pending.get("ticks", 0)
+        return 0
+
+
+def singleton(name, policy=None):
+    """Décorateur : exécution exclusive de la fonction `name` (bail sur etl-state/locks/<name>.lock)."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            mode = policy or OVERLAP_POLICY
+            guard = RunGuard(name, os.environ["AZURE_STORAGE_CONNECTION_STRING"])
+            if not guard.acquire():
+                _count(name, "skipped")
+                if mode == "coalesce":
+                    guard.mark_pending()
+                logging.info(f"⏭️ '{name}' déjà en cours sur une autre exécution : tick ignoré"
+                             f"{' (relance prévue)' if mode == 'coalesce' else ''}.")
+                return None
+            try:
+                # 🧹 Les ticks notés avant cette exécution sont couverts par elle
+                guard.take_pending()
+                _count(name, "runs")
+                func(*args, **kwargs)
+                if guard.lease_lost:
+                    # 🚫 Bail perdu : une autre exécution a pu démarrer, les ticks notés restent pour elle
+                    logging.warning(f"🚫 '{name}' : bail perdu pendant l'exécution, pas de relance coalescée.")
+                    return None
+                ticks = guard.take_pending() if mode == "coalesce" else 0
+                if ticks:
+                    _count(name, "coalesced", ticks)
+                    logging.info(f"🔁 '{name}' : {ticks} tick(s) ignoré(s) pendant l'exécution, coalescé(s) en une relance.")
+                    func(*args, **kwargs)
+            finally:
+                guard.release()
+                logging.info(f"📊 Garde '{name}' : {metrics_snapshot().get(name)}")
+        return wrapper
+    return decorator
@@ -0,0 +1,35 @@
+"""Jointure en étoile locale : résolution des clés étrangères Notion via les dimensions extraites."""
+import csv, io, logging
+from azure.core.exceptions import ResourceNotFoundError
+from azure.storage.blob import BlobServiceClient
+
+
+# 🗂️ Index de hachage {clé: valeur} construit à partir d'un CSV de dimension
+def load_dimension_index(connection_string, container, blob_name, key="ID_Page", value="Nom"):
+    blob_service = BlobServiceClient.from_connection_string(connection_string)
+    try:
+        raw = blob_service.get_container_client(container).download_blob(blob_name).readall()
+    except ResourceNotFoundError:
+        logging.warning(f"⚠️ Dimension '{container}/{blob_name}' introuvable : résolution en direct uniquement.")
+        return {}
+    reader = csv.DictReader(io.StringIO(raw.decode("utf-8-sig")))
+    index = {row[key]: row.get(value, "") for row in reader if row.get(key)}
+    logging.info(f"🗂️ Dimension '{blob_name}' indexée : {len(index)} clé(s)")
+    return index
+
+
+def resolve_foreign_keys(rows, fk_column, out_column, index, resolve_missing=None):
+    """
+    Renseigne out_column à partir de la clé étrangère fk_column de chaque ligne.
+    Les clés absentes de la dimension (ex. page créée depuis le dernier export)
+    sont résolues en un seul lot via resolve_missing({clés}) → {clé: valeur}.
+    """
+    missing = {row[fk_column] for row in rows if row.get(fk_column) and row[fk_column] not in index}
+    resolved = {}
+    if missing and resolve_missing:
+        resolved = resolve_missing(missing)
+        logging.info(f"🔗 {len(missing)} clé(s) '{fk_column}' absente(s) de la dimension, résolues en direct.")
+    for row in rows:
+        fk = row.get(fk_column)
+        row[out_column] = (index.get(fk) or resolved.get(fk) or "") if fk else ""
+    return rows
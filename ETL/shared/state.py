@@ -0,0 +1,48 @@
+"""État persistant des fonctions (watermarks, snapshots) stocké en JSON dans Azure Blob.
+
+Les noms se terminant par ".gz" sont compressés en gzip (snapshots volumineux).
+"""
+import gzip, json, logging, os
+from azure.core.exceptions import ResourceExistsError, ResourceNotFoundError
+from azure.storage.blob import BlobServiceClient
+
+STATE_CONTAINER = os.environ.get("ETL_STATE_CONTAINER", "etl-state")
+
+
+class StateStore:
+    def __init__(self, connection_string, container=STATE_CONTAINER):
+        blob_service = BlobServiceClient.from_connection_string(connection_string)
+        self.container = blob_service.get_container_client(container)
+
+    def load(self, name, default=None):
+        try:
+            raw = self.container.download_blob(name).readall()
+        except ResourceNotFoundError:
+            return default
+        try:
+            if name.endswith(".gz"):
+                raw = gzip.decompress(raw)
+            return json.loads(raw)
+        except (ValueError, OSError) as e:
+            logging.warning(f"⚠️ État '{name}' illisible, ignoré : {e}")
+            return default
+
+    def save(self, name, value):
+        data = json.dumps(value, ensure_ascii=False)
+        if name.endswith(".gz"):
+            data = gzip.compress(data.encode("utf-8"))
+        try:
+            self.container.upload_blob(name=name, data=data, overwrite=True)
+        except ResourceNotFoundError:
+            # 🆕 Premier passage : le conteneur d'état n'existe pas encore
+            try:
+                self.container.create_container()
+            except ResourceExistsError:
+                pass
+            self.container.upload_blob(name=name, data=data, overwrite=True)
+
+    def delete(self, name):
+        try:
+            self.container.delete_blob(name)
+        except ResourceNotFoundError:
+            pass